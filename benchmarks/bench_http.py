@@ -0,0 +1,141 @@
+"""Requests and pagination against a local HTTP server
+
+Measures, against the server in `benchmarks/server.py`:
+
+- the throughput and per-request time of `HTTPServiceClient.get`, and its
+  overhead over a plain `requests.Session`
+- the time to drain `PaginatedResults` for several page sizes and latencies
+- the peak memory used by the client to drain them, that of the pages held
+  at once, and per page held (Python 3 only)
+
+The server runs in its own process, so that it isn't measured.
+
+Results are printed as JSON, or written to `--output`, to compare releases:
+
+    PYTHONPATH=. python benchmarks/bench_http.py --output results.json
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import timeit
+
+from requests import Session
+
+import demands
+from demands import HTTPServiceClient
+from demands.metrics import monotonic
+from demands.pagination import PaginatedResults
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+sys.path.insert(0, __file__.rsplit('/', 1)[0])
+from server import start_server_process  # noqa: E402
+
+TOTAL_ITEMS = 2000
+PAGE_SIZES = (10, 100, 1000)
+LATENCIES = (0, 0.005)
+
+
+def bench_requests(url, number):
+    session = Session()
+    client = HTTPServiceClient(url)
+    results = []
+    for name, send in (
+            ('requests.Session', lambda: session.get(url + 'item')),
+            ('HTTPServiceClient', lambda: client.get('/item'))):
+        send()  # open the connection
+        seconds = min(timeit.repeat(send, number=number, repeat=3))
+        results.append({
+            'name': name,
+            'requests': number,
+            'per_request_us': seconds / number * 1e6,
+            'requests_per_second': number / seconds,
+        })
+    session.close()
+    client.close()
+    return {
+        'results': results,
+        'overhead_us': (
+            results[1]['per_request_us'] - results[0]['per_request_us']),
+    }
+
+
+def drain(client, page_size, latency, **options):
+    def get_items(page, page_size):
+        return client.get('/items', stream=bool(options.get('stream')),
+                          params={'page': page, 'page_size': page_size,
+                                  'total': TOTAL_ITEMS, 'latency': latency})
+
+    results = PaginatedResults(get_items, page_size=page_size, **options)
+    start_time = monotonic()
+    items = sum(1 for _ in results)
+    assert items == TOTAL_ITEMS, items
+    return monotonic() - start_time
+
+
+def bench_pagination(url):
+    client = HTTPServiceClient(url)
+    results = []
+    for latency in LATENCIES:
+        for page_size in PAGE_SIZES:
+            for options in ({}, {'prefetch': 4}, {'stream': True}):
+                pages = -(-TOTAL_ITEMS // page_size)
+                if tracemalloc is not None:
+                    tracemalloc.start()
+                seconds = drain(client, page_size, latency, **options)
+                result = {
+                    'page_size': page_size,
+                    'latency': latency,
+                    'options': options,
+                    'pages': pages,
+                    'seconds': seconds,
+                    'items_per_second': TOTAL_ITEMS / seconds,
+                }
+                if tracemalloc is not None:
+                    # the pages held at once: one, or the prefetched pages
+                    # and the page being consumed
+                    _, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                    result['peak_memory_bytes'] = peak
+                    result['peak_memory_per_page_bytes'] = peak // min(
+                        pages, options.get('prefetch', 0) + 1)
+                results.append(result)
+    client.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--output', help='Write the results to this file')
+    parser.add_argument('--requests', type=int, default=500,
+                        help='Requests per round of the request benchmark')
+    args = parser.parse_args()
+
+    server = start_server_process()
+    try:
+        report = {
+            'demands_version': demands.__version__,
+            'python': platform.python_implementation(),
+            'python_version': platform.python_version(),
+            'timestamp': int(time.time()),
+            'requests': bench_requests(server.url, args.requests),
+            'pagination': bench_pagination(server.url),
+        }
+    finally:
+        server.stop()
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
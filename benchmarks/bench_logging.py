@@ -0,0 +1,96 @@
+"""Per-request cost of the debug logging in `HTTPServiceClient.request`
+
+Sends requests to a stub adapter, which returns a canned response without
+any I/O, with the request logging of a previous release, and with the
+current logging with DEBUG disabled and enabled.
+
+    PYTHONPATH=. python benchmarks/bench_logging.py
+"""
+import logging
+import os
+import time
+import timeit
+
+from requests import Response
+from requests.adapters import BaseAdapter
+
+from demands import HTTPServiceClient, log
+from demands.metrics import monotonic
+
+NUMBER = 5000
+
+
+class StubAdapter(BaseAdapter):
+    def send(self, request, **kwargs):
+        response = Response()
+        response.status_code = 200
+        response.url = request.url
+        response.request = request
+        response._content = b'{}'
+        return response
+
+    def close(self):
+        pass
+
+
+class PreviousLoggingClient(HTTPServiceClient):
+    """Times and logs every request, whether DEBUG is enabled or not"""
+
+    def _is_timed(self, request_params):
+        return True
+
+    def _log_request(self, method, response, sanitized_params, start_time):
+        log.debug(
+            '%s HTTP [%s] call to "%s" %.2fms',
+            response.status_code, method, response.url,
+            (time.time() - time.time()) * 1000)
+        logged_params = dict(sanitized_params)
+        auth = logged_params.pop('auth', None)
+        log.debug('HTTP request params: %s', logged_params)
+        if auth:
+            log.debug('Authentication via HTTP auth as "%s"', auth[0])
+
+
+def get_client(client_class):
+    client = client_class(
+        'http://service.com/', auth=('user', 'password'),
+        headers=dict(('X-Header-%d' % i, 'value') for i in range(20)))
+    client.mount('http://', StubAdapter())
+    return client
+
+
+def report(name, fn):
+    seconds = min(timeit.repeat(fn, number=NUMBER, repeat=5))
+    print('%-32s %8.2fus per request' % (name, seconds / NUMBER * 1e6))
+
+
+def main():
+    handler = logging.StreamHandler(open(os.devnull, 'w'))
+    log.addHandler(handler)
+    cases = (
+        ('previous, DEBUG off', PreviousLoggingClient, logging.INFO),
+        ('DEBUG off', HTTPServiceClient, logging.INFO),
+        ('DEBUG on', HTTPServiceClient, logging.DEBUG))
+
+    for name, client_class, level in cases:
+        log.setLevel(level)
+        client = get_client(client_class)
+        report('request(), %s' % name,
+               lambda: client.get('/path', params={'page': 1}))
+
+    # the logging alone, without the cost of sending the request
+    response = get_client(HTTPServiceClient).get('/path')
+    sanitized_params = {
+        'method': 'GET', 'url': 'http://service.com/path',
+        'params': {'page': 1}, 'auth': ('user', 'password'),
+        'headers': dict(('X-Header-%d' % i, 'value') for i in range(20))}
+    for name, client_class, level in cases:
+        log.setLevel(level)
+        client = get_client(client_class)
+        report('logging, %s' % name, lambda: client._log_request(
+            'GET', response, sanitized_params,
+            client._is_timed(sanitized_params) and monotonic() or None))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Per-request cost of merging the shared request params
+
+Compares `HTTPServiceClient._get_request_params` with the `copy.deepcopy`
+merge it replaced, for a client with large shared params.
+
+    PYTHONPATH=. python benchmarks/bench_request_params.py
+"""
+import copy
+import timeit
+
+from requests.auth import HTTPBasicAuth
+from six import iteritems
+
+from demands import HTTPServiceClient
+
+NUMBER = 20000
+
+
+def deepcopy_request_params(client, **kwargs):
+    request_params = copy.deepcopy(client._shared_request_params)
+    for key, value in iteritems(kwargs):
+        if isinstance(value, dict) and key in request_params:
+            request_params[key].update(value)
+        else:
+            request_params[key] = value
+    return request_params
+
+
+def main():
+    client = HTTPServiceClient(
+        'http://service.com/',
+        headers=dict(('X-Header-%d' % i, 'value') for i in range(50)),
+        cookies={'session': 'abc'},
+        cert=('/path/to/cert', '/path/to/key'),
+        auth=HTTPBasicAuth('user', 'password'),
+        client_name='benchmark', client_version='1.0.0')
+    kwargs = {'method': 'GET', 'url': 'http://service.com/path',
+              'headers': {'X-Request-Id': '1'}, 'params': {'page': 1}}
+
+    for name, merge in (
+            ('deepcopy', lambda: deepcopy_request_params(client, **kwargs)),
+            ('_get_request_params',
+             lambda: client._get_request_params(**kwargs))):
+        seconds = min(timeit.repeat(merge, number=NUMBER, repeat=3))
+        print('%-20s %8.2fus per request' % (name, seconds / NUMBER * 1e6))
+
+
+if __name__ == '__main__':
+    main()
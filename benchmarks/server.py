@@ -0,0 +1,108 @@
+"""A local HTTP server for benchmarks
+
+Runs in a background thread with `start_server`, or in its own process with
+`start_server_process`, so that it isn't measured with the client, such as
+by `tracemalloc`.
+
+Serves JSON from two endpoints, both accepting a `latency` query param, in
+seconds, to wait before responding:
+
+- `/item`: a small object
+- `/items?page=&page_size=&total=`: a page of `total` items, with `count`
+"""
+import json
+import subprocess
+import sys
+import threading
+import time
+
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from six.moves.socketserver import ThreadingMixIn
+from six.moves.urllib.parse import parse_qsl, urlsplit
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # send the headers and body together, without waiting for delayed ACKs
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = dict(parse_qsl(url.query))
+        latency = float(query.get('latency', 0))
+        if latency:
+            time.sleep(latency)
+
+        if url.path == '/items':
+            body = self.get_page(
+                int(query.get('page', 1)), int(query.get('page_size', 100)),
+                int(query.get('total', 1000)))
+        elif url.path == '/item':
+            body = {'id': 1, 'name': 'item 1'}
+        else:
+            self.send_error(404)
+            return
+
+        content = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def get_page(self, page, page_size, total):
+        start = (page - 1) * page_size
+        end = min(start + page_size, total)
+        return {
+            'results': [
+                {'id': i, 'name': 'item %d' % i, 'tags': ['a', 'b', 'c']}
+                for i in range(start, end)],
+            'count': total,
+        }
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    @property
+    def url(self):
+        return 'http://%s:%d/' % self.server_address
+
+
+def start_server():
+    """Start a `StubServer` on a free port, call `shutdown()` to stop it"""
+    server = StubServer(('127.0.0.1', 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+class ServerProcess(object):
+    """A `StubServer` running in a child process"""
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, __file__], stdout=subprocess.PIPE)
+        self.url = self.process.stdout.readline().decode('utf-8').strip()
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+        self.process.stdout.close()
+
+
+def start_server_process():
+    """Start a `StubServer` in a child process, call `stop()` to stop it"""
+    return ServerProcess()
+
+
+if __name__ == '__main__':
+    server = StubServer(('127.0.0.1', 0), StubHandler)
+    print(server.url)
+    sys.stdout.flush()
+    server.serve_forever()
@@ -1,17 +1,33 @@
-import copy
 import inspect
+import json
 import logging
+import threading
 import time
+from collections import OrderedDict
+from functools import partial
+from itertools import islice
+from multiprocessing.pool import ThreadPool
 
 from requests import Session
-from six import PY2, iteritems, itervalues
+from requests.adapters import HTTPAdapter
+from six import PY2, binary_type, iteritems, text_type
+from six.moves.queue import Empty, Queue
+from six.moves.urllib.parse import urlsplit
 
+from demands.coalesce import SingleFlight
+from demands.deadline import (
+    DeadlineExceeded, bind, check_deadline, get_remaining)
+from demands.http2 import HTTP2Adapter
+from demands.metrics import RequestEvent, get_path_template, monotonic
 __doc__ = 'Base HTTP service client'
 __version__ = '5.1.0'
 __url__ = 'https://github.com/yola/demands'
 
 log = logging.getLogger(__name__)
 
+_CREDENTIAL_HEADERS = frozenset(
+    ['authorization', 'cookie', 'proxy-authorization'])
+
 
 def get_args(fun):
     if PY2:
@@ -20,43 +36,214 @@ def get_args(fun):
 
 
 class HTTPServiceError(AssertionError):
+    """Raised for a response that isn't acceptable
+
+    The details of the response and the message are only parsed and
+    formatted when they are used, so that catching and discarding the error
+    is cheap. The details in the message are truncated to
+    `max_details_length` characters, set it to `None` to not truncate them.
+    """
+
+    max_details_length = 1000
+
     def __init__(self, response):
         """
         :param response: the HTTP response which was deemed in error
         """
         self.response = response
+        super(AssertionError, self).__init__()
+
+    @property
+    def details(self):
+        """The JSON decoded body of the response, or its content"""
+        if '_details' not in self.__dict__:
+            try:
+                self._details = self.response.json()
+            except ValueError:
+                self._details = self.response.content
+        return self._details
+
+    @details.setter
+    def details(self, details):
+        self._details = details
+
+    @property
+    def message(self):
+        if '_message' not in self.__dict__:
+            details = '%s' % (self.details,)
+            if (self.max_details_length is not None and
+                    len(details) > self.max_details_length):
+                details = '%s... (%d characters truncated)' % (
+                    details[:self.max_details_length],
+                    len(details) - self.max_details_length)
+            self._message = (
+                'Unexpected response: url: %s, code: %s, details: %s' % (
+                    self.response.url, self.response.status_code, details))
+        return self._message
+
+    @property
+    def args(self):
+        if '_args' in self.__dict__:
+            return self._args
+        return (self.message,)
+
+    @args.setter
+    def args(self, args):
+        # such as to add context to the error before raising it again
+        self._args = tuple(args)
+
+    def __str__(self):
+        if '_args' not in self.__dict__:
+            return self.message
+        if len(self._args) == 1:
+            return '%s' % (self._args[0],)
+        return str(self._args) if self._args else ''
+
+    def __repr__(self):
+        if len(self.args) == 1:
+            return '%s(%r)' % (type(self).__name__, self.args[0])
+        return '%s%r' % (type(self).__name__, self.args)
+
+    def __reduce__(self):
+        # the state keeps the formatted message, as `args` isn't set
+        self.message
+        return _new_error, (type(self),), self.__dict__
+
+
+def _new_error(cls):
+    """Create an error to restore the state of, when unpickling"""
+    return cls.__new__(cls)
+
+
+def _get_size(body):
+    """Return the size of a request or response body, `None` if unknown"""
+    if body is None:
+        return 0
+    if isinstance(body, (binary_type, text_type)):
+        return len(body)
+    return None
+
+
+def _get_bytes_sent(sanitized_params, response=None):
+    """Return the size of the body of a request, `None` if unknown
+
+    The body sent is used when the response has its request, otherwise the
+    size is only known for `data` passed as bytes or text.
+    """
+    request = getattr(response, 'request', None)
+    if request is not None:
+        return _get_size(request.body)
+    if sanitized_params.get('json') is not None:
+        return None
+    return _get_size(sanitized_params.get('data'))
+
+
+class _LoggedParams(object):
+    """Request params without `auth`, formatted only if they are logged"""
+
+    def __init__(self, params):
+        self.params = params
+
+    def __str__(self):
+        return str(dict(
+            (key, value) for key, value in iteritems(self.params)
+            if key != 'auth'))
+
+
+def _discard(response):
+    """Release the connection of a response that won't be used"""
+    if response is not None:
+        response.close()
+
+
+def _start_thread(target):
+    thread = threading.Thread(target=target)
+    thread.daemon = True
+    thread.start()
+
+
+def _get_origin(url):
+    """Return the scheme and host of `url`"""
+    url = urlsplit(url)
+    return url.scheme.lower(), url.netloc.lower()
+
+
+def _without_credentials(params):
+    """Return request params without `auth`, `cookies` and the headers
+    sending credentials
+    """
+    params = dict(
+        (key, value) for key, value in iteritems(params)
+        if key not in ('auth', 'cookies'))
+    if params.get('headers'):
+        params['headers'] = dict(
+            (name, value) for name, value in iteritems(params['headers'])
+            if name.lower() not in _CREDENTIAL_HEADERS)
+    return params
+
+
+def _imap_bounded(pool, fn, items, window, ordered=True):
+    """Return `fn(item)` for each of `items`, called by a `ThreadPool`
+
+    Like `pool.imap`, or `imap_unordered` if `ordered` is `False`, but with
+    at most `window` calls pending, so that items are only taken as results
+    are consumed.
+    """
+    items = enumerate(items)
+    finished = Queue()
+
+    def call(index, item):
         try:
-            self.details = response.json()
-        except ValueError:
-            self.details = response.content
-        super(AssertionError, self).__init__(
-            'Unexpected response: url: %s, code: %s, details: %s' % (
-                response.url, response.status_code, self.details)
-        )
+            return fn(item)
+        finally:
+            if not ordered:
+                finished.put(index)
 
+    pending = OrderedDict(
+        (index, pool.apply_async(call, (index, item)))
+        for index, item in islice(items, window))
+    while pending:
+        index = next(iter(pending)) if ordered else finished.get()
+        result = pending.pop(index).get()
+        for index, item in islice(items, 1):
+            pending[index] = pool.apply_async(call, (index, item))
+        yield result
 
-class HTTPServiceClient(Session):
-    """Extendable base service client.
 
-    Client can be configured with any param allowed by the requests API. These
-    params will be uses with each and every request and can be overridden with
-    kwargs.  `demands` adds the following params:
+def _acquire(semaphore, timeout=None):
+    """Acquire `semaphore`, return `False` if it takes over `timeout`"""
+    if timeout is None:
+        return semaphore.acquire()
+    if not PY2:
+        return semaphore.acquire(timeout=max(0, timeout))
+    # semaphores can't time out on Python 2
+    expires = monotonic() + timeout
+    while not semaphore.acquire(False):
+        if monotonic() >= expires:
+            return False
+        time.sleep(0.001)
+    return True
 
-    :param expected_response_codes: (optional) Workaround for services which
-        returns non-expected results, example: when search for users, and
-        expect [] for when nobody is found, yet a 404 is returned.
-    :param client_name: (optional) Sets the User-Agent header.  Important
-        because we want to accurately log errors and throw deprecation
-        warnings when clients are outdated
-    :param client_version: (optional) Used with client_name
-    :param app_name: (optional) Used with client_name
-    :param cookies: (optional) Dict only, CookieJar not supported
+
+def _split_request(request):
+    """Return the path and kwargs of a request passed to `map`"""
+    if isinstance(request, tuple):
+        return request
+    return request, {}
+
+
+class BaseServiceClient(object):
+    """Request parameter handling shared by the service clients.
+
+    Takes care of client identification, merging the shared params with the
+    params of each request and removing params not used by `requests`.
     """
 
-    _VALID_REQUEST_ARGS = get_args(Session.request)
+    _VALID_REQUEST_ARGS = frozenset(get_args(Session.request))
+    _COALESCED_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
 
     def __init__(self, url, **kwargs):
-        super(HTTPServiceClient, self).__init__()
+        super(BaseServiceClient, self).__init__()
         self.url = url
 
         if 'client_name' in kwargs:
@@ -65,11 +252,42 @@ class HTTPServiceClient(Session):
                 kwargs.get('client_name'),
                 kwargs.get('client_version', 'x.y.z'),
                 kwargs.get('app_name', 'unknown'),)
+        if 'verify_ssl' in kwargs:
+            kwargs['verify'] = kwargs.pop('verify_ssl')
         self._shared_request_params = kwargs
 
+    @property
+    def url(self):
+        return self._url
+
+    @url.setter
+    def url(self, url):
+        self._url = url
+        self._base_url = url.rstrip('/') + '/'
+        self._origin = _get_origin(url)
+
+    def _get_url(self, path):
+        if not path:
+            return self._url
+        if path.startswith(('http://', 'https://')):
+            # such as the next page URLs of paginated responses
+            return path
+        return self._base_url + path.lstrip('/')
+
     def _get_request_params(self, **kwargs):
-        """Merge shared params and new params."""
-        request_params = copy.deepcopy(self._shared_request_params)
+        """Merge shared params and new params.
+
+        Shared params are not copied, apart from dicts such as headers or
+        cookies, which are copied one level deep so that they can be updated
+        by the request or modified by `pre_send`. The shared credentials are
+        only sent to the host of the service, as `requests` does on redirects.
+        """
+        shared_params = self._shared_request_params
+        if 'url' in kwargs and _get_origin(kwargs['url']) != self._origin:
+            shared_params = _without_credentials(shared_params)
+        request_params = dict(
+            (key, dict(value) if isinstance(value, dict) else value)
+            for key, value in iteritems(shared_params))
         for key, value in iteritems(kwargs):
             if isinstance(value, dict) and key in request_params:
                 # ensure we don't lose dict values like headers or cookies
@@ -85,44 +303,166 @@ class HTTPServiceClient(Session):
         return dict((key, val) for key, val in request_params.items()
                     if key in self._VALID_REQUEST_ARGS)
 
-    def request(self, method, path, **kwargs):
-        """Send a :class:`requests.Request` and demand a
-        :class:`requests.Response`
-        """
-        if path:
-            url = '%s/%s' % (self.url.rstrip('/'), path.lstrip('/'))
-        else:
-            url = self.url
-
-        request_params = self._get_request_params(method=method,
-                                                  url=url, **kwargs)
-        request_params = self.pre_send(request_params)
-
-        sanitized_params = self._sanitize_request_params(request_params)
-        start_time = time.time()
-        response = super(HTTPServiceClient, self).request(**sanitized_params)
+    def _is_timed(self, request_params):
+        """Return whether requests are timed, for `metrics` or debug logs"""
+        return 'metrics' in request_params or log.isEnabledFor(logging.DEBUG)
 
+    def _log_request(self, method, response, sanitized_params, start_time):
+        if start_time is None or not log.isEnabledFor(logging.DEBUG):
+            return
         # Log request and params (without passwords)
         log.debug(
             '%s HTTP [%s] call to "%s" %.2fms',
             response.status_code, method, response.url,
-            (time.time() - start_time) * 1000)
-        auth = sanitized_params.pop('auth', None)
-        log.debug('HTTP request params: %s', sanitized_params)
+            (monotonic() - start_time) * 1000)
+        log.debug('HTTP request params: %s', _LoggedParams(sanitized_params))
+        auth = sanitized_params.get('auth')
         if auth:
             log.debug('Authentication via HTTP auth as "%s"', auth[0])
 
+    def _record_request(self, request_params, sanitized_params, start_time,
+                        attempt_time=None, response=None, retries=0,
+                        error=None):
+        """Pass a `RequestEvent` for the request to the `metrics` hook"""
+        metrics = request_params.get('metrics')
+        if metrics is None:
+            return
+        end_time = monotonic()
+        url = sanitized_params['url']
+        event = RequestEvent(
+            method=sanitized_params['method'].upper(),
+            path_template=(request_params.get('path_template') or
+                           get_path_template(urlsplit(url).path)),
+            url=url, duration=end_time - start_time, retries=retries,
+            bytes_sent=_get_bytes_sent(sanitized_params, response),
+            error=error)
+        if response is not None:
+            event.status_code = response.status_code
+            event.from_cache = getattr(response, 'from_cache', False) is True
+            if sanitized_params.get('stream'):
+                content_length = response.headers.get('Content-Length')
+                if content_length is not None:
+                    event.bytes_received = int(content_length)
+            else:
+                event.bytes_received = _get_size(response.content)
+            elapsed = getattr(response, 'elapsed', None)
+            if attempt_time is not None and elapsed:
+                event.ttfb = elapsed.total_seconds()
+                if not sanitized_params.get('stream'):
+                    event.download = max(
+                        0, end_time - attempt_time - event.ttfb)
+        metrics(event)
+
+    def _get_coalescing_key(self, sanitized_params, request_params):
+        """Return the key identical requests are coalesced by, or `None`"""
+        # the body of a streamed response can only be read by one caller
+        if (not request_params.get('coalesce') or
+                sanitized_params.get('stream') or
+                sanitized_params['method'].upper() not in
+                self._COALESCED_METHODS):
+            return None
+        return json.dumps(sanitized_params, sort_keys=True, default=repr)
+
+    def _get_cache_entry(self, sanitized_params, request_params):
+        """Return the cache key and the cached entry for a request"""
+        cache = request_params.get('cache')
+        if cache is None:
+            return None, None
+        cache_key = cache.get_key(
+            sanitized_params, session_cookies=self._get_session_cookies())
+        if cache_key is None:
+            return None, None
+        return cache_key, cache.get(cache_key)
+
+    def _get_session_cookies(self):
+        """Return the cookies sent with every request, besides its params"""
+        return None
+
+    def _add_validators(self, sanitized_params, cache_entry):
+        """Make the request conditional on the cached response changing"""
+        headers = dict(sanitized_params.get('headers') or {})
+        headers.update(cache_entry.validators)
+        return dict(sanitized_params, headers=headers)
+
+    def _apply_deadline(self, sanitized_params):
+        """Bound the timeout of a request by the time left to the deadline
+
+        Raises `DeadlineExceeded` if the deadline has passed.
+        """
+        remaining = check_deadline()
+        if remaining is None:
+            return sanitized_params
+        timeout = sanitized_params.get('timeout')
+        if isinstance(timeout, tuple):
+            timeout = tuple(
+                remaining if value is None else min(value, remaining)
+                for value in timeout)
+        elif timeout is None:
+            timeout = remaining
+        else:
+            timeout = min(timeout, remaining)
+        return dict(sanitized_params, timeout=timeout)
+
+    def _acquire_circuit(self, sanitized_params, request_params):
+        """Return the circuit key of a request, raise if it is open"""
+        circuit_breaker = request_params.get('circuit_breaker')
+        if circuit_breaker is None:
+            return None
+        return circuit_breaker.acquire(sanitized_params['url'])
+
+    def _release_circuit(self, request_params, circuit, response=None,
+                         error=None):
+        circuit_breaker = request_params.get('circuit_breaker')
+        if circuit_breaker is None:
+            return
+        if isinstance(error, DeadlineExceeded):
+            # the request wasn't sent, so it says nothing of the service
+            circuit_breaker.cancel(circuit)
+        else:
+            circuit_breaker.release(circuit, response, error)
+
+    def _get_retry_delay(self, response, retry, request_params):
+        """Return the seconds to wait before `retry`, or `None`"""
+        retry_policy = request_params.get('retry_policy')
+        if retry_policy is None:
+            return None
+        delay = retry_policy.get_delay(
+            request_params['method'], response, retry,
+            max_delay=get_remaining())
+        if delay is not None:
+            log.debug(
+                'Retrying %s HTTP [%s] call to "%s" in %.2fs',
+                response.status_code, request_params['method'],
+                response.url, delay)
+        return delay
+
+    def _is_hedge_winner(self, response, request_params):
+        """Return whether a response to a hedged request can be used"""
+        if response is None:
+            return False
+        response.is_ok = response.status_code < 300
+        return self.is_acceptable(response, request_params)
+
+    def _pick_hedge_result(self, result, next_result, request_params):
+        """Return the better of two `(response, error)` hedge results
+
+        Acceptable responses are better than others, and responses are better
+        than errors. The result that isn't picked is discarded.
+        """
+        if (result[0] is None or
+                self._is_hedge_winner(next_result[0], request_params)):
+            result, next_result = next_result, result
+        _discard(next_result[0])
+        return result
+
+    def _demand(self, response, request_params):
         response.is_ok = response.status_code < 300
         if not self.is_acceptable(response, request_params):
             raise HTTPServiceError(response)
-        response = self.post_send(response, **request_params)
-        return response
+        return self.post_send(response, **request_params)
 
     def pre_send(self, request_params):
         """Override this method to modify sent request parameters"""
-        for adapter in itervalues(self.adapters):
-            adapter.max_retries = request_params.get('max_retries', 0)
-
         return request_params
 
     def post_send(self, response, **kwargs):
@@ -146,3 +486,313 @@ class HTTPServiceClient(Session):
         """
         expected_codes = request_params.get('expected_response_codes', [])
         return response.is_ok or response.status_code in expected_codes
+
+
+class HTTPServiceClient(BaseServiceClient, Session):
+    """Extendable base service client.
+
+    Client can be configured with any param allowed by the requests API. These
+    params will be uses with each and every request and can be overridden with
+    kwargs.  `demands` adds the following params:
+
+    :param expected_response_codes: (optional) Workaround for services which
+        returns non-expected results, example: when search for users, and
+        expect [] for when nobody is found, yet a 404 is returned.
+    :param client_name: (optional) Sets the User-Agent header.  Important
+        because we want to accurately log errors and throw deprecation
+        warnings when clients are outdated
+    :param client_version: (optional) Used with client_name
+    :param app_name: (optional) Used with client_name
+    :param cookies: (optional) Dict only, CookieJar not supported
+    :param max_retries: (optional) Retries for failed connections, used by
+        the adapter for each request without modifying the mounted adapters
+    :param retry_policy: (optional) A `demands.retry.RetryPolicy`, to retry
+        responses with selected status codes
+    :param cache: (optional) A `demands.cache.ResponseCache`, to cache
+        responses to GET requests
+    :param coalesce: (optional) Share a single request, and its response or
+        connection error, between concurrent identical GET, HEAD and OPTIONS
+        requests. Each request demands its own copy of the response with its
+        own params. Streamed requests aren't coalesced
+    :param hedge_policy: (optional) A `demands.hedge.HedgePolicy`, to send
+        slow GET, HEAD and OPTIONS requests again and use the first acceptable
+        response
+    :param circuit_breaker: (optional) A `demands.breaker.CircuitBreaker`,
+        to fail fast with `CircuitOpenError` while the service is failing
+    :param metrics: (optional) Callable receiving a
+        `demands.metrics.RequestEvent` for each request, such as a
+        `demands.metrics.MetricsAggregator`
+    :param path_template: (optional) Path template requests are reported to
+        `metrics` by, such as `/users/{id}/`. Defaults to the path with
+        numeric segments replaced by `{id}`
+
+    The connection pools of the client can be configured with:
+
+    :param pool_connections: (optional) Number of hosts to keep connection
+        pools for
+    :param pool_maxsize: (optional) Number of connections to keep in each
+        pool, should be at least the number of threads sharing the client
+    :param pool_block: (optional) Wait for a free connection when a pool is
+        full, instead of opening a connection that is discarded after use
+    :param keep_alive: (optional) Set to `False` to close connections after
+        each request
+    :param http2: (optional) Send requests with a
+        `demands.http2.HTTP2Adapter`, multiplexing concurrent requests to a
+        host over a single HTTP/2 connection. Requires `httpx`, and can't be
+        combined with the pool options
+
+    Requests to services with strict limits can be throttled with:
+
+    :param rate_limiter: (optional) A `demands.throttle.RateLimiter`, to limit
+        the requests sent per second
+    :param max_in_flight: (optional) Number of requests that can be sent at
+        once by the threads sharing the client, others wait for their turn
+
+    A client can be shared by many threads: `request` doesn't modify the
+    shared params or the mounted adapters. Cookies set by responses are
+    stored in the client and sent by all threads, as with any
+    :class:`requests.Session`.
+    """
+
+    def __init__(self, url, pool_connections=None, pool_maxsize=None,
+                 pool_block=None, keep_alive=True, max_in_flight=None,
+                 http2=False, **kwargs):
+        if not keep_alive:
+            kwargs['headers'] = dict(kwargs.get('headers') or {},
+                                     Connection='close')
+        super(HTTPServiceClient, self).__init__(url, **kwargs)
+        self._local = threading.local()
+        self._retry_adapters = {}
+        self._in_flight = SingleFlight()
+        self._max_in_flight = None
+        if max_in_flight is not None:
+            self._max_in_flight = threading.BoundedSemaphore(max_in_flight)
+
+        pool_kwargs = dict(
+            (key, value) for key, value in (
+                ('pool_connections', pool_connections),
+                ('pool_maxsize', pool_maxsize),
+                ('pool_block', pool_block))
+            if value is not None)
+        if http2 and pool_kwargs:
+            raise ValueError(
+                'Pool options are not supported with http2, mount an '
+                'HTTP2Adapter with httpx limits instead')
+        if http2:
+            adapter = HTTP2Adapter()
+            self.mount('https://', adapter)
+            self.mount('http://', adapter)
+        elif pool_kwargs:
+            self.mount('https://', HTTPAdapter(**pool_kwargs))
+            self.mount('http://', HTTPAdapter(**pool_kwargs))
+
+    def request(self, method, path, **kwargs):
+        """Send a :class:`requests.Request` and demand a
+        :class:`requests.Response`
+        """
+        url = self._get_url(path)
+        request_params = self._get_request_params(method=method,
+                                                  url=url, **kwargs)
+        request_params = self.pre_send(request_params)
+
+        sanitized_params = self._sanitize_request_params(request_params)
+        coalescing_key = self._get_coalescing_key(
+            sanitized_params, request_params)
+        if coalescing_key is not None:
+            response = self._in_flight.do(
+                coalescing_key, self._fetch, sanitized_params,
+                request_params)
+        else:
+            response = self._fetch(sanitized_params, request_params)
+        return self._demand(response, request_params)
+
+    def _fetch(self, sanitized_params, request_params):
+        """Return the response to a request, from the cache or sent"""
+        method = request_params['method']
+        timed = self._is_timed(request_params)
+        start_time = monotonic() if timed else None
+        cache_key, cache_entry = self._get_cache_entry(
+            sanitized_params, request_params)
+        if cache_entry is not None and cache_entry.is_fresh:
+            response = cache_entry.get_response()
+            self._record_request(
+                request_params, sanitized_params, start_time,
+                response=response)
+            return response
+        if cache_entry is not None:
+            sanitized_params = self._add_validators(
+                sanitized_params, cache_entry)
+
+        circuit = self._acquire_circuit(sanitized_params, request_params)
+        if 'retry_policy' in request_params:
+            request_params['retry_policy'].add_request()
+
+        retry = 0
+        while True:
+            attempt_time = monotonic() if timed else None
+            try:
+                response = self._send(sanitized_params, request_params)
+            except Exception as e:
+                self._release_circuit(request_params, circuit, error=e)
+                self._record_request(
+                    request_params, sanitized_params, start_time,
+                    retries=retry, error=e)
+                raise
+            self._log_request(
+                method, response, sanitized_params, attempt_time)
+            retry += 1
+            delay = self._get_retry_delay(response, retry, request_params)
+            if delay is None:
+                break
+            response.close()
+            time.sleep(delay)
+
+        self._release_circuit(request_params, circuit, response)
+        if cache_key is not None:
+            response = request_params['cache'].update(
+                cache_key, response, cache_entry)
+        self._record_request(
+            request_params, sanitized_params, start_time, attempt_time,
+            response, retry - 1)
+        return response
+
+    def _send(self, sanitized_params, request_params):
+        hedge_policy = request_params.get('hedge_policy')
+        if (hedge_policy is not None and
+                hedge_policy.applies(request_params['method'])):
+            return self._send_hedged(
+                hedge_policy, sanitized_params, request_params)
+        return self._send_one(sanitized_params, request_params)
+
+    def _send_hedged(self, hedge_policy, sanitized_params, request_params):
+        """Send the request again if it is slow, return the best response
+
+        Requests are sent by threads, while this thread waits for them.
+        Responses received after the best response is picked are discarded.
+        """
+        hedge_policy.add_request()
+        results = Queue()
+        lock = threading.Lock()
+        picked = []
+
+        def send():
+            try:
+                result = self._send_one(sanitized_params, request_params), None
+            except Exception as e:
+                result = None, e
+            with lock:
+                if not picked:
+                    results.put(result)
+                    return
+            _discard(result[0])
+        send = bind(send)
+
+        start_time = monotonic()
+        _start_thread(send)
+        pending = 1
+        try:
+            result = results.get(timeout=hedge_policy.get_delay())
+        except Empty:
+            if hedge_policy.spend_budget():
+                log.debug('Hedging slow HTTP [%s] call to "%s"',
+                          request_params['method'], sanitized_params['url'])
+                _start_thread(send)
+                pending += 1
+            result = results.get()
+        pending -= 1
+        while pending and not self._is_hedge_winner(result[0], request_params):
+            result = self._pick_hedge_result(
+                result, results.get(), request_params)
+            pending -= 1
+
+        with lock:
+            picked.append(result)
+        while not results.empty():
+            _discard(results.get()[0])
+        hedge_policy.record(monotonic() - start_time)
+
+        response, error = result
+        if error is not None:
+            raise error
+        return response
+
+    def _send_one(self, sanitized_params, request_params):
+        # wait for the rate limiter first, not to hold a slot meanwhile, and
+        # not past the deadline
+        if ('rate_limiter' in request_params and
+                not request_params['rate_limiter'].acquire(
+                    timeout=get_remaining())):
+            raise DeadlineExceeded(
+                'Deadline exceeded waiting for the rate limiter')
+        if self._max_in_flight is None:
+            return self._send_now(sanitized_params, request_params)
+        if not _acquire(self._max_in_flight, get_remaining()):
+            raise DeadlineExceeded(
+                'Deadline exceeded waiting for a request in flight')
+        try:
+            return self._send_now(sanitized_params, request_params)
+        finally:
+            self._max_in_flight.release()
+
+    def _send_now(self, sanitized_params, request_params):
+        sanitized_params = self._apply_deadline(sanitized_params)
+        self._local.max_retries = request_params.get('max_retries', 0)
+        try:
+            return super(HTTPServiceClient, self).request(**sanitized_params)
+        finally:
+            del self._local.max_retries
+
+    def _get_session_cookies(self):
+        return self.cookies
+
+    def map(self, method, requests, concurrency=10, ordered=True):
+        """Send many requests with a pool of `concurrency` threads
+
+        Each of `requests` is a path, or a `(path, kwargs)` tuple, sent with
+        `method` through `request`. Returns `(request, result)` tuples in the
+        order of `requests`, or as they complete if `ordered` is `False`. The
+        result is the response, or the `HTTPServiceError` or connection error
+        raised for the request:
+
+            for path, result in service.map('GET', ['/users/1/', '/users/2/']):
+                if isinstance(result, Exception):
+                    ...
+
+        Requests are taken from `requests` as results are consumed, with up
+        to `concurrency` of them sent ahead.
+        """
+        pool = ThreadPool(concurrency)
+        try:
+            send = partial(bind(self._map_request), method)
+            for result in _imap_bounded(
+                    pool, send, requests, concurrency, ordered):
+                yield result
+        finally:
+            pool.terminate()
+
+    def _map_request(self, method, request):
+        path, kwargs = _split_request(request)
+        try:
+            return request, self.request(method, path, **kwargs)
+        except (HTTPServiceError, IOError) as e:
+            return request, e
+
+    def get_adapter(self, url):
+        """Return the adapter for `url`, with the `max_retries` of the request
+
+        Mounted adapters are never modified. Instead, each is copied once per
+        `max_retries` value, with the copies sharing its connection pools.
+        """
+        adapter = super(HTTPServiceClient, self).get_adapter(url)
+        if not hasattr(adapter, 'max_retries'):
+            return adapter
+
+        max_retries = getattr(self._local, 'max_retries', 0)
+        key = (adapter, max_retries)
+        retry_adapter = self._retry_adapters.get(key)
+        if retry_adapter is None:
+            retry_adapter = object.__new__(type(adapter))
+            retry_adapter.__dict__.update(adapter.__dict__)
+            retry_adapter.max_retries = max_retries
+            retry_adapter = self._retry_adapters.setdefault(key, retry_adapter)
+        return retry_adapter
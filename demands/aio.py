@@ -0,0 +1,583 @@
+"""Asyncio service client
+
+Requires Python 3.6+. The default transport requires `aiohttp`, install it
+with the `aio` extra: `pip install demands[aio]`. The HTTP/2 transport
+requires `httpx`, install it with the `http2` extra.
+"""
+import asyncio
+import copy
+import ssl
+import time
+from collections import deque
+from datetime import timedelta
+from itertools import islice
+
+from requests import ConnectionError, ConnectTimeout, ReadTimeout, Response
+from requests.structures import CaseInsensitiveDict
+
+from demands import BaseServiceClient, HTTPServiceError, _split_request, log
+from demands.deadline import DeadlineExceeded, check_deadline, get_remaining
+from demands.metrics import monotonic
+from demands.pagination import (
+    ORDERED, PAGINATION_TYPE, PREFETCH, Page, PaginatedResults,
+    PaginationType)
+
+
+class AiohttpTransport(object):
+    """Sends requests with an `aiohttp.ClientSession`
+
+    Accepts the params used by `requests` and returns a
+    :class:`requests.Response`, so responses look the same as those of
+    `HTTPServiceClient`, and raises the exceptions of `requests` for
+    connection errors and timeouts. The `files`, `hooks`, `stream` and `cert`
+    params are not supported.
+    """
+
+    def __init__(self, **session_kwargs):
+        try:
+            import aiohttp
+        except ImportError:
+            raise ImportError(
+                'AiohttpTransport requires aiohttp, '
+                'install it with: pip install demands[aio]')
+        self._aiohttp = aiohttp
+        self._session_kwargs = session_kwargs
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None:
+            self._session = self._aiohttp.ClientSession(**self._session_kwargs)
+        return self._session
+
+    async def __call__(self, method, url, params=None, data=None,
+                       headers=None, cookies=None, auth=None, timeout=None,
+                       allow_redirects=True, proxies=None, verify=None,
+                       json=None, **kwargs):
+        unsupported = [key for key, value in kwargs.items() if value]
+        if unsupported:
+            raise ValueError(
+                'Unsupported request params: %s' % ', '.join(unsupported))
+
+        if isinstance(auth, tuple):
+            auth = self._aiohttp.BasicAuth(*auth)
+        if isinstance(timeout, tuple):
+            timeout = self._aiohttp.ClientTimeout(
+                sock_connect=timeout[0], sock_read=timeout[1])
+        elif timeout is not None:
+            timeout = self._aiohttp.ClientTimeout(total=timeout)
+        proxy = None
+        if proxies:
+            proxy = proxies.get(url.split(':', 1)[0])
+        if isinstance(verify, str):
+            verify = ssl.create_default_context(cafile=verify)
+        elif verify is not None:
+            verify = None if verify else False
+
+        aiohttp = self._aiohttp
+        # aiohttp < 3.10 raises read timeouts for connection timeouts too
+        connect_timeout = getattr(aiohttp, 'ConnectionTimeoutError', ())
+        start_time = monotonic()
+        try:
+            async with self._get_session().request(
+                    method, url, params=params, data=data, json=json,
+                    headers=headers, cookies=cookies, auth=auth,
+                    timeout=timeout, allow_redirects=allow_redirects,
+                    proxy=proxy, ssl=verify,
+            ) as aiohttp_response:
+                response = Response()
+                response.elapsed = timedelta(
+                    seconds=monotonic() - start_time)
+                response.status_code = aiohttp_response.status
+                response.reason = aiohttp_response.reason
+                response.url = str(aiohttp_response.url)
+                response.headers = CaseInsensitiveDict(
+                    aiohttp_response.headers)
+                response.encoding = aiohttp_response.charset
+                response._content = await aiohttp_response.read()
+                response._content_consumed = True
+                return response
+        except connect_timeout as e:
+            raise ConnectTimeout(e)
+        except asyncio.TimeoutError as e:
+            raise ReadTimeout(e)
+        except aiohttp.ClientError as e:
+            raise ConnectionError(e)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class HttpxTransport(object):
+    """Sends requests with an `httpx.AsyncClient`, over HTTP/2 when possible
+
+    Concurrent requests to hosts that support HTTP/2, over HTTPS, share a
+    single connection per host:
+
+        service = AsyncHTTPServiceClient(
+            url='https://localhost/', transport=HttpxTransport())
+
+    Like `AiohttpTransport`, accepts the params used by `requests` and returns
+    a :class:`requests.Response`, with the `http_version` of the response.
+    The `files`, `hooks`, `stream`, `cert` and `proxies` params, and `verify`
+    other than `True`, are not supported: pass `verify`, `cert` and `proxy`
+    to the transport, with any other `httpx.AsyncClient` arguments.
+
+    :param http2: Set to `False` to only use HTTP/1.1
+    """
+
+    def __init__(self, http2=True, **client_kwargs):
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError(
+                'HttpxTransport requires httpx, '
+                'install it with: pip install demands[http2]')
+        self._httpx = httpx
+        self._client_kwargs = dict(client_kwargs, http2=http2)
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = self._httpx.AsyncClient(**self._client_kwargs)
+        return self._client
+
+    async def __call__(self, method, url, params=None, data=None,
+                       headers=None, cookies=None, auth=None, timeout=None,
+                       allow_redirects=True, verify=True, json=None,
+                       **kwargs):
+        unsupported = [key for key, value in kwargs.items() if value]
+        if verify is not True and verify is not None:
+            unsupported.append('verify')
+        if unsupported:
+            raise ValueError(
+                'Unsupported request params: %s' % ', '.join(unsupported))
+
+        httpx = self._httpx
+        headers = dict(headers or {})
+        if cookies:
+            headers['Cookie'] = '; '.join(
+                '%s=%s' % cookie for cookie in cookies.items())
+        content = None
+        if isinstance(data, (bytes, str)):
+            content, data = data, None
+        if isinstance(timeout, tuple):
+            timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        else:
+            timeout = httpx.Timeout(timeout)
+
+        client = self._get_client()
+        httpx_request = client.build_request(
+            method, url, params=params, content=content, data=data,
+            json=json, headers=headers, timeout=timeout)
+        start_time = monotonic()
+        try:
+            httpx_response = await client.send(
+                httpx_request, auth=auth, follow_redirects=allow_redirects,
+                stream=True)
+            elapsed = timedelta(seconds=monotonic() - start_time)
+            try:
+                await httpx_response.aread()
+            finally:
+                await httpx_response.aclose()
+        except httpx.ConnectTimeout as e:
+            raise ConnectTimeout(e)
+        except httpx.TimeoutException as e:
+            raise ReadTimeout(e)
+        except httpx.TransportError as e:
+            raise ConnectionError(e)
+
+        response = Response()
+        response.elapsed = elapsed
+        response.status_code = httpx_response.status_code
+        response.reason = httpx_response.reason_phrase
+        response.url = str(httpx_response.url)
+        response.headers = CaseInsensitiveDict(httpx_response.headers.items())
+        response.encoding = httpx_response.charset_encoding
+        response.http_version = httpx_response.http_version
+        response._content = httpx_response.content
+        response._content_consumed = True
+        return response
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class AsyncSingleFlight(object):
+    """Awaits a coroutine function once for concurrent calls with the same key
+
+    While a call for a key is running, further calls for the key wait for it
+    and get a shallow copy of its result, or raise its exception.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, fn, *args, **kwargs):
+        call = self._calls.get(key)
+        if call is not None:
+            return copy.copy(await asyncio.shield(call))
+
+        call = self._calls[key] = asyncio.ensure_future(fn(*args, **kwargs))
+        try:
+            return await asyncio.shield(call)
+        finally:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+
+
+class AsyncHTTPServiceClient(BaseServiceClient):
+    """Extendable base service client for asyncio.
+
+    Configured and extended like `HTTPServiceClient`, with the same
+    `pre_send`, `post_send` and `is_acceptable` hooks, but the request
+    methods are coroutines:
+
+        service = AsyncHTTPServiceClient(url='http://localhost/')
+        response = await service.get('/users/1234/')
+        await service.close()
+
+    :param transport: (optional) Coroutine function that sends a request. It
+        receives the params used by `requests` and returns a response with the
+        attributes of a :class:`requests.Response`. Defaults to an
+        `AiohttpTransport`.
+    :param max_in_flight: (optional) Number of requests that can be sent at
+        once, others wait for their turn
+    """
+
+    def __init__(self, url, transport=None, max_in_flight=None, **kwargs):
+        super(AsyncHTTPServiceClient, self).__init__(url, **kwargs)
+        self.transport = transport or AiohttpTransport()
+        self.max_in_flight = max_in_flight
+        self._in_flight = AsyncSingleFlight()
+        self._max_in_flight = None
+
+    async def request(self, method, path, **kwargs):
+        """Send a request and demand a :class:`requests.Response`"""
+        url = self._get_url(path)
+        request_params = self._get_request_params(method=method,
+                                                  url=url, **kwargs)
+        request_params = self.pre_send(request_params)
+
+        sanitized_params = self._sanitize_request_params(request_params)
+        coalescing_key = self._get_coalescing_key(
+            sanitized_params, request_params)
+        if coalescing_key is not None:
+            response = await self._in_flight.do(
+                coalescing_key, self._fetch, sanitized_params,
+                request_params)
+        else:
+            response = await self._fetch(sanitized_params, request_params)
+        return self._demand(response, request_params)
+
+    async def _fetch(self, sanitized_params, request_params):
+        """Return the response to a request, from the cache or sent"""
+        method = request_params['method']
+        timed = self._is_timed(request_params)
+        start_time = monotonic() if timed else None
+        cache_key, cache_entry = self._get_cache_entry(
+            sanitized_params, request_params)
+        if cache_entry is not None and cache_entry.is_fresh:
+            response = cache_entry.get_response()
+            self._record_request(
+                request_params, sanitized_params, start_time,
+                response=response)
+            return response
+        if cache_entry is not None:
+            sanitized_params = self._add_validators(
+                sanitized_params, cache_entry)
+
+        circuit = self._acquire_circuit(sanitized_params, request_params)
+        if 'retry_policy' in request_params:
+            request_params['retry_policy'].add_request()
+
+        retry = 0
+        while True:
+            attempt_time = monotonic() if timed else None
+            try:
+                response = await self._send(sanitized_params, request_params)
+            except Exception as e:
+                self._release_circuit(request_params, circuit, error=e)
+                self._record_request(
+                    request_params, sanitized_params, start_time,
+                    retries=retry, error=e)
+                raise
+            self._log_request(
+                method, response, sanitized_params, attempt_time)
+            retry += 1
+            delay = self._get_retry_delay(response, retry, request_params)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+
+        self._release_circuit(request_params, circuit, response)
+        if cache_key is not None:
+            response = request_params['cache'].update(
+                cache_key, response, cache_entry)
+        self._record_request(
+            request_params, sanitized_params, start_time, attempt_time,
+            response, retry - 1)
+        return response
+
+    async def _send(self, sanitized_params, request_params):
+        hedge_policy = request_params.get('hedge_policy')
+        if (hedge_policy is not None and
+                hedge_policy.applies(request_params['method'])):
+            return await self._send_hedged(
+                hedge_policy, sanitized_params, request_params)
+        return await self._send_one(sanitized_params, request_params)
+
+    async def _send_hedged(self, hedge_policy, sanitized_params,
+                           request_params):
+        """Send the request again if it is slow, return the best response
+
+        The request that isn't used is cancelled.
+        """
+        hedge_policy.add_request()
+        start_time = monotonic()
+        tasks = [asyncio.ensure_future(
+            self._send_one(sanitized_params, request_params))]
+        done, _ = await asyncio.wait(tasks, timeout=hedge_policy.get_delay())
+        if not done and hedge_policy.spend_budget():
+            log.debug('Hedging slow HTTP [%s] call to "%s"',
+                      request_params['method'], sanitized_params['url'])
+            tasks.append(asyncio.ensure_future(
+                self._send_one(sanitized_params, request_params)))
+
+        result = None, None
+        try:
+            for task in asyncio.as_completed(tasks):
+                try:
+                    next_result = await task, None
+                except Exception as e:
+                    next_result = None, e
+                result = self._pick_hedge_result(
+                    result, next_result, request_params)
+                if self._is_hedge_winner(result[0], request_params):
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+        hedge_policy.record(monotonic() - start_time)
+
+        response, error = result
+        if error is not None:
+            raise error
+        return response
+
+    async def _send_one(self, sanitized_params, request_params):
+        # wait for the rate limiter first, not to hold a slot meanwhile, and
+        # not past the deadline
+        if 'rate_limiter' in request_params:
+            delay = request_params['rate_limiter'].reserve(
+                max_delay=get_remaining())
+            if delay is None:
+                raise DeadlineExceeded(
+                    'Deadline exceeded waiting for the rate limiter')
+            if delay:
+                await asyncio.sleep(delay)
+        if self.max_in_flight is None:
+            return await self._send_now(sanitized_params, request_params)
+        if self._max_in_flight is None:
+            # created on first use, in the running event loop
+            self._max_in_flight = asyncio.Semaphore(self.max_in_flight)
+        remaining = get_remaining()
+        try:
+            await asyncio.wait_for(
+                self._max_in_flight.acquire(),
+                None if remaining is None else max(0, remaining))
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(
+                'Deadline exceeded waiting for a request in flight')
+        try:
+            return await self._send_now(sanitized_params, request_params)
+        finally:
+            self._max_in_flight.release()
+
+    async def _send_now(self, sanitized_params, request_params):
+        sanitized_params = self._apply_deadline(sanitized_params)
+        return await self.transport(**sanitized_params)
+
+    async def get(self, path, **kwargs):
+        kwargs.setdefault('allow_redirects', True)
+        return await self.request('GET', path, **kwargs)
+
+    async def options(self, path, **kwargs):
+        kwargs.setdefault('allow_redirects', True)
+        return await self.request('OPTIONS', path, **kwargs)
+
+    async def head(self, path, **kwargs):
+        kwargs.setdefault('allow_redirects', False)
+        return await self.request('HEAD', path, **kwargs)
+
+    async def post(self, path, data=None, json=None, **kwargs):
+        return await self.request(
+            'POST', path, data=data, json=json, **kwargs)
+
+    async def put(self, path, data=None, **kwargs):
+        return await self.request('PUT', path, data=data, **kwargs)
+
+    async def patch(self, path, data=None, **kwargs):
+        return await self.request('PATCH', path, data=data, **kwargs)
+
+    async def delete(self, path, **kwargs):
+        return await self.request('DELETE', path, **kwargs)
+
+    async def map(self, method, requests, concurrency=10, ordered=True):
+        """Send many requests, up to `concurrency` at a time
+
+        Works like `HTTPServiceClient.map`, iterated with `async for`, with
+        up to `concurrency` requests sent ahead of the results consumed.
+        """
+        async def send(request):
+            path, kwargs = _split_request(request)
+            try:
+                return request, await self.request(method, path, **kwargs)
+            except (HTTPServiceError, IOError) as e:
+                return request, e
+
+        requests = iter(requests)
+        pending = deque(
+            asyncio.ensure_future(send(request))
+            for request in islice(requests, concurrency))
+        try:
+            while pending:
+                if ordered:
+                    task = pending.popleft()
+                else:
+                    done, _ = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED)
+                    task = done.pop()
+                    pending.remove(task)
+                result = await task
+                for request in islice(requests, 1):
+                    pending.append(asyncio.ensure_future(send(request)))
+                yield result
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def close(self):
+        close = getattr(self.transport, 'close', None)
+        if close is not None:
+            await close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+
+class AsyncPaginatedResults(PaginatedResults):
+    """Paginated API results for coroutine functions
+
+    Configured like `PaginatedResults`, but the paginated function is a
+    coroutine function and the results are iterated with `async for`:
+
+        async for user in AsyncPaginatedResults(service.get_users):
+            ...
+
+    With `prefetch`, up to that many pages are fetched concurrently in the
+    event loop.
+    """
+
+    def __aiter__(self):
+        return self._iter_items()
+
+    async def _iter_items(self):
+        skip = self._resume_offset()
+        page_number = 0
+        async for page in self._iter_async_pages():
+            page_number += 1
+            self._start_page(page, skip)
+            for item in islice(page.items, skip, None):
+                self._position_offset += 1
+                yield item
+            skip = 0
+            self._finish_page(page, page_number)
+
+    async def _iter_async_pages(self):
+        if self.options[PAGINATION_TYPE] == PaginationType.CURSOR:
+            cursor = self._start_page_id()
+            while True:
+                page = await self._get_async_page(cursor)
+                yield page
+                if page.is_last_page:
+                    return
+                cursor = page.next_cursor
+
+        page_ids = self._page_ids()
+        first_page = await self._get_async_page(next(page_ids))
+        yield first_page
+        if first_page.is_last_page:
+            return
+
+        prefetch = self.options[PREFETCH]
+        counted = bool(prefetch) and first_page.total_count is not None
+        if counted:
+            page_ids = iter(self._remaining_page_ids(
+                first_page.page_id, first_page.total_count))
+        unordered = counted and not self.options[ORDERED]
+
+        pending = deque(
+            asyncio.ensure_future(self._get_async_page(page_id))
+            for page_id in islice(page_ids, max(prefetch, 1)))
+        try:
+            while pending:
+                if unordered:
+                    done, _ = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED)
+                    task = done.pop()
+                    pending.remove(task)
+                else:
+                    task = pending.popleft()
+                page = await task
+                yield page
+                if page.is_last_page and not counted:
+                    return
+                for page_id in islice(page_ids, 1):
+                    pending.append(asyncio.ensure_future(
+                        self._get_async_page(page_id)))
+        finally:
+            # pages fetched speculatively past the last page are discarded
+            for task in pending:
+                task.cancel()
+
+    async def iter_pages(self):
+        """Return the pages of results, as `Page` objects
+
+        When resuming, pages are returned whole, from the page of the
+        `position`.
+        """
+        self._resume_offset()
+        page_number = 0
+        async for page in self._iter_async_pages():
+            page_number += 1
+            self._start_page(page)
+            yield page
+            self._position_offset = page.size
+            self._finish_page(page, page_number)
+
+    async def iter_batches(self, size):
+        """Return lists of `size` items, the last list may be shorter"""
+        batch = []
+        async for page in self.iter_pages():
+            batch.extend(page.items)
+            while len(batch) >= size:
+                yield batch[:size]
+                del batch[:size]
+        if batch:
+            yield batch
+
+    async def _get_async_page(self, page):
+        check_deadline()
+        kwargs = self._page_kwargs(page)
+        start_time = time.time()
+        one_page_data = await self.paginated_fn(*self.args, **kwargs)
+        page = Page(one_page_data, self.options, page_id=page)
+        page.latency = time.time() - start_time
+        return page
@@ -0,0 +1,141 @@
+import threading
+from collections import deque
+
+from six.moves.urllib.parse import urlsplit
+
+from demands import HTTPServiceError
+from demands.metrics import monotonic
+
+
+def host_key(url):
+    """Return the scheme and host of `url`, to keep a circuit per host"""
+    url = urlsplit(url)
+    return '%s://%s' % (url.scheme, url.netloc)
+
+
+class CircuitOpenError(HTTPServiceError):
+    """Raised instead of sending a request while its circuit is open"""
+
+    def __init__(self, key, retry_after):
+        """
+        :param key: Key of the open circuit
+        :param retry_after: Seconds until the circuit lets a request through
+        """
+        self.key = key
+        self.retry_after = retry_after
+        super(CircuitOpenError, self).__init__(None)
+
+    @property
+    def details(self):
+        return None
+
+    @property
+    def message(self):
+        return 'Circuit open: %s, retry after %.2fs' % (
+            self.key, self.retry_after)
+
+
+class _Circuit(object):
+    def __init__(self):
+        self.failures = deque()
+        self.opened_at = None
+        self.probe_started_at = None
+
+
+class CircuitBreaker(object):
+    """Fails fast while an upstream is failing, instead of waiting for it
+
+    Pass an instance to a service client as the `circuit_breaker` param,
+    shared by all of its requests or for a single request:
+
+        service = HTTPServiceClient(
+            url='http://localhost/', circuit_breaker=CircuitBreaker())
+
+    A circuit opens after `failures` failed requests in `window` seconds.
+    Requests fail, connection errors and timeouts included, if they raise an
+    exception or get a response with a status code in `status_codes`.
+    While the circuit is open, requests raise `CircuitOpenError` without
+    being sent. After `reset_timeout` seconds a single request is sent as a
+    probe: the circuit closes if it succeeds, and opens again if it fails.
+
+    All requests share a circuit, unless `key` is set to a function of the
+    request URL returning the key of its circuit, such as `host_key`.
+
+    :param failures: Failed requests in `window` that open the circuit
+    :param window: Seconds failed requests are counted for
+    :param reset_timeout: Seconds the circuit stays open before a probe
+    :param status_codes: Status codes of failed responses
+    :param key: (optional) Function of the URL returning the circuit key
+    """
+
+    FAILURE_STATUS_CODES = frozenset([500, 502, 503, 504])
+
+    def __init__(self, failures=5, window=60, reset_timeout=30,
+                 status_codes=FAILURE_STATUS_CODES, key=None):
+        self.failures = failures
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.status_codes = frozenset(status_codes)
+        self.key = key
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, url):
+        """Return the circuit key for a request to `url`
+
+        Raises `CircuitOpenError` if the circuit is open, or if it is half
+        open and another request is probing it.
+        """
+        key = self.key(url) if self.key is not None else None
+        now = monotonic()
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if circuit is None or circuit.opened_at is None:
+                return key
+            retry_after = circuit.opened_at + self.reset_timeout - now
+            if circuit.probe_started_at is not None:
+                # a probe that never finished doesn't hold the circuit open
+                retry_after = (
+                    circuit.probe_started_at + self.reset_timeout - now)
+            if retry_after > 0:
+                raise CircuitOpenError(key, retry_after)
+            circuit.probe_started_at = now
+            return key
+
+    def release(self, key, response=None, error=None):
+        """Record the outcome of a request allowed by `acquire`"""
+        failed = error is not None or (
+            response is not None and response.status_code in self.status_codes)
+        now = monotonic()
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if not failed:
+                if circuit is not None and circuit.opened_at is not None:
+                    del self._circuits[key]
+                return
+            if circuit is None:
+                circuit = self._circuits[key] = _Circuit()
+            if circuit.probe_started_at is not None:
+                circuit.opened_at = now
+                circuit.probe_started_at = None
+                return
+            circuit.failures.append(now)
+            while circuit.failures[0] <= now - self.window:
+                circuit.failures.popleft()
+            if len(circuit.failures) >= self.failures:
+                circuit.opened_at = now
+                circuit.failures.clear()
+
+    def cancel(self, key):
+        """Forget a request allowed by `acquire` that wasn't sent"""
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if circuit is not None:
+                circuit.probe_started_at = None
+
+    def is_open(self, url):
+        """Return whether the circuit for `url` is open, or half open"""
+        key = self.key(url) if self.key is not None else None
+        with self._lock:
+            circuit = self._circuits.get(key)
+            return circuit is not None and circuit.opened_at is not None
@@ -0,0 +1,251 @@
+import base64
+import copy
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+
+
+_UNKNOWN_AUTH = object()
+
+
+def _get_auth_key(auth):
+    """Return the credentials of `auth`, `_UNKNOWN_AUTH` if they're unknown
+    """
+    if auth is None or isinstance(auth, (tuple, list)):
+        return auth
+    if hasattr(auth, 'username') and hasattr(auth, 'password'):
+        # such as HTTPBasicAuth, whose repr differs between instances
+        return [type(auth).__name__, auth.username, auth.password]
+    return _UNKNOWN_AUTH
+
+
+def _get_cookies_key(cookies):
+    """Return the cookies of a dict or cookie jar, sorted"""
+    if not cookies:
+        return []
+    if isinstance(cookies, dict):
+        return sorted(cookies.items())
+    return sorted(
+        (cookie.domain, cookie.path, cookie.name, cookie.value)
+        for cookie in cookies)
+
+
+class CacheEntry(object):
+    def __init__(self, response, expires):
+        self.response = response
+        self.expires = expires
+
+    @property
+    def is_fresh(self):
+        return time.time() < self.expires
+
+    @property
+    def validators(self):
+        """Headers to revalidate the cached response with"""
+        headers = {}
+        if 'ETag' in self.response.headers:
+            headers['If-None-Match'] = self.response.headers['ETag']
+        if 'Last-Modified' in self.response.headers:
+            headers['If-Modified-Since'] = (
+                self.response.headers['Last-Modified'])
+        return headers
+
+    def get_response(self):
+        response = copy.copy(self.response)
+        response.from_cache = True
+        return response
+
+
+class MemoryStore(object):
+    """Keeps up to `max_entries` cache entries, least recently used first"""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class DiskStore(object):
+    """Keeps cache entries as JSON files in `directory`
+
+    Only the status code, headers, content, URL and encoding of responses are
+    stored. Their requests aren't, so credentials sent with them aren't
+    written to disk.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as entry_file:
+                data = json.loads(entry_file.read().decode('utf-8'))
+            return self._load_entry(data)
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def set(self, key, entry):
+        data = json.dumps(self._dump_entry(entry))
+        fd, path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as entry_file:
+            entry_file.write(data.encode('utf-8'))
+        os.rename(path, self._path(key))
+
+    def _dump_entry(self, entry):
+        response = entry.response
+        return {
+            'expires': entry.expires,
+            'status_code': response.status_code,
+            'reason': response.reason,
+            'url': response.url,
+            'encoding': response.encoding,
+            'headers': list(response.headers.items()),
+            'content': base64.b64encode(response.content).decode('ascii'),
+        }
+
+    def _load_entry(self, data):
+        response = Response()
+        response.status_code = data['status_code']
+        response.reason = data['reason']
+        response.url = data['url']
+        response.encoding = data['encoding']
+        response.headers = CaseInsensitiveDict(data['headers'])
+        response._content = base64.b64decode(data['content'])
+        response._content_consumed = True
+        return CacheEntry(response, data['expires'])
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+
+class ResponseCache(object):
+    """Caches successful responses to GET requests
+
+    Pass an instance to a service client as the `cache` param, shared by all
+    of its requests or for a single request:
+
+        service = HTTPServiceClient(
+            url='http://localhost/', cache=ResponseCache(ttl=300))
+
+    Responses are cached for the `max-age` of their `Cache-Control` header,
+    or for `ttl` seconds, and aren't cached if it includes `no-store`. Stale
+    responses with an `ETag` or `Last-Modified` header are revalidated with
+    `If-None-Match` or `If-Modified-Since`, and served from the cache if the
+    service answers 304 Not Modified.
+
+    Cached responses go through `is_acceptable` and `post_send` like fresh
+    ones, and have `from_cache` set to `True`.
+
+    :param store: Where to keep responses, a `MemoryStore` by default. Use a
+        `DiskStore` to share them between processes
+    :param ttl: Seconds to cache responses without `max-age` for
+    :param vary_headers: Request headers that are part of the cache key
+    """
+
+    MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+    def __init__(self, store=None, ttl=60,
+                 vary_headers=('Accept', 'Accept-Language', 'Authorization')):
+        self.store = store if store is not None else MemoryStore()
+        self.ttl = ttl
+        self.vary_headers = tuple(vary_headers)
+
+    def get_key(self, sanitized_params, session_cookies=None):
+        """Return the cache key for a request, `None` if it isn't cacheable
+
+        The key includes the credentials of the request, so that responses
+        are only served to requests with the same credentials: the
+        `Authorization` and `Cookie` headers, the `cookies` param and
+        `session_cookies`, and the username and password of `auth`. Requests
+        with other kinds of `auth` aren't cached.
+
+        :param session_cookies: (optional) Cookie jar of the session the
+            request is sent with
+        """
+        if sanitized_params['method'].upper() != 'GET':
+            return None
+        auth = _get_auth_key(sanitized_params.get('auth'))
+        if auth is _UNKNOWN_AUTH:
+            return None
+        headers = dict(
+            (name.lower(), value) for name, value in
+            (sanitized_params.get('headers') or {}).items())
+        key = json.dumps([
+            sanitized_params['url'],
+            sanitized_params.get('params'),
+            [headers.get(name.lower()) for name in self.vary_headers],
+            [headers.get(name) for name in ('authorization', 'cookie')],
+            _get_cookies_key(sanitized_params.get('cookies')),
+            _get_cookies_key(session_cookies),
+            auth,
+        ], sort_keys=True, default=repr)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def update(self, key, response, entry=None):
+        """Cache `response` and return the response for the request
+
+        If `response` is a 304 revalidating `entry`, `entry` is refreshed and
+        its response returned.
+        """
+        if entry is not None and response.status_code == 304:
+            ttl = self._get_ttl(response)
+            entry = CacheEntry(entry.response, time.time() + (ttl or 0))
+            self.store.set(key, entry)
+            return entry.get_response()
+
+        if response.status_code == 200:
+            ttl = self._get_ttl(response)
+            if ttl is not None:
+                response.content  # read the body before caching
+                self.store.set(key, CacheEntry(response, time.time() + ttl))
+            else:
+                self.store.delete(key)
+        return response
+
+    def _get_ttl(self, response):
+        cache_control = response.headers.get('Cache-Control', '').lower()
+        if 'no-store' in cache_control:
+            return None
+        if 'no-cache' in cache_control:
+            return 0
+        max_age = self.MAX_AGE_RE.search(cache_control)
+        if max_age:
+            return int(max_age.group(1))
+        return self.ttl
@@ -0,0 +1,110 @@
+"""Deadlines for all of the requests made in a block of code
+
+    with deadline(5):
+        user = service.get_user(1234)
+        posts = list(service.get_posts(user['id']))
+
+Requests made by service clients in the block, or in nested calls, get the
+time left before the deadline as their `timeout`, or their own `timeout` if
+it is shorter. Once the deadline has passed they raise `DeadlineExceeded`
+without being sent, and `PaginatedResults` stops fetching pages. Note that
+`requests` applies a `timeout` to connecting and to each read, so a slow
+response can still overrun the deadline, by up to `timeout`.
+
+Deadlines are kept in a context variable, or in a thread local on Python
+versions without `contextvars`. Asyncio tasks inherit the deadline of the
+code that creates them, on Python 3.7+. Use `bind` to pass the deadline to
+other threads.
+"""
+import threading
+from contextlib import contextmanager
+
+from requests import Timeout
+
+from demands.metrics import monotonic
+
+try:
+    from contextvars import ContextVar
+except ImportError:  # Python < 3.7
+    ContextVar = None
+
+
+class DeadlineExceeded(Timeout):
+    """Raised instead of sending a request after the deadline has passed"""
+
+
+if ContextVar is not None:
+    _deadline = ContextVar('demands_deadline', default=None)
+
+    def get_deadline():
+        """Return the `monotonic` time of the deadline, `None` if there is
+        no deadline
+        """
+        return _deadline.get()
+
+    @contextmanager
+    def _deadline_at(expires):
+        token = _deadline.set(expires)
+        try:
+            yield
+        finally:
+            _deadline.reset(token)
+else:
+    _local = threading.local()
+
+    def get_deadline():
+        """Return the `monotonic` time of the deadline, `None` if there is
+        no deadline
+        """
+        return getattr(_local, 'deadline', None)
+
+    @contextmanager
+    def _deadline_at(expires):
+        outer = get_deadline()
+        _local.deadline = expires
+        try:
+            yield
+        finally:
+            _local.deadline = outer
+
+
+def deadline(seconds):
+    """Set a deadline `seconds` from now for the requests in a `with` block
+
+    A nested deadline can't be later than the deadline it is nested in.
+    """
+    expires = monotonic() + seconds
+    outer = get_deadline()
+    if outer is not None:
+        expires = min(expires, outer)
+    return _deadline_at(expires)
+
+
+def get_remaining():
+    """Return the seconds left before the deadline, `None` if there is none
+    """
+    expires = get_deadline()
+    if expires is None:
+        return None
+    return expires - monotonic()
+
+
+def check_deadline():
+    """Raise `DeadlineExceeded` if the deadline has passed"""
+    remaining = get_remaining()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded(
+            'Deadline exceeded by %.2fs' % -remaining)
+    return remaining
+
+
+def bind(fn):
+    """Return `fn`, to call with the current deadline from other threads"""
+    expires = get_deadline()
+    if expires is None:
+        return fn
+
+    def bound(*args, **kwargs):
+        with _deadline_at(expires):
+            return fn(*args, **kwargs)
+    return bound
@@ -0,0 +1,81 @@
+import threading
+
+from demands.metrics import LatencyHistogram
+
+
+class HedgePolicy(object):
+    """Sends a second request when the first is slow to respond
+
+    Pass an instance to a service client as the `hedge_policy` param, shared
+    by all of its requests or for a single request:
+
+        service = HTTPServiceClient(
+            url='http://localhost/', hedge_policy=HedgePolicy(delay=0.05))
+
+    If a request gets no response within `delay` seconds, the same request
+    is sent again, and the first acceptable response, by `is_acceptable`, is
+    used. The other response is discarded, or cancelled by the async client.
+    Only requests with idempotent `methods` are hedged.
+
+    With `percentile`, requests wait for that percentile of the latencies
+    of previous requests using the policy, such as 95 for the p95, once it
+    has seen `min_samples` of them.
+
+    Hedges are limited by a budget, shared by all requests using the policy,
+    so that they can't double the load on a slow service. Every request adds
+    `budget_ratio` to the budget, up to `budget_max`, and every hedge spends
+    one.
+
+    :param delay: Seconds to wait for a response before hedging
+    :param percentile: (optional) Percentile of previous latencies to wait
+        for before hedging, instead of `delay`
+    :param min_samples: Latencies to see before using `percentile`
+    :param methods: HTTP methods of requests to hedge
+    :param budget_ratio: Hedges allowed for each request
+    :param budget_max: Hedges the budget can hold, which is also the initial
+        budget
+    """
+
+    HEDGED_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+
+    def __init__(self, delay=0.05, percentile=None, min_samples=100,
+                 methods=HEDGED_METHODS, budget_ratio=0.1, budget_max=10):
+        self.delay = delay
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.methods = frozenset(method.upper() for method in methods)
+        self.budget_ratio = budget_ratio
+        self.budget_max = budget_max
+        self._budget = float(budget_max)
+        self._latency = LatencyHistogram()
+        self._lock = threading.Lock()
+
+    def applies(self, method):
+        return method.upper() in self.methods
+
+    def get_delay(self):
+        """Return the seconds to wait for a response before hedging"""
+        with self._lock:
+            if (self.percentile is None or
+                    self._latency.count < self.min_samples):
+                return self.delay
+            return self._latency.percentile(self.percentile)
+
+    def record(self, latency):
+        """Record the latency of a request, hedged or not"""
+        with self._lock:
+            self._latency.add(latency)
+
+    def add_request(self):
+        """Add a request's share of hedges to the budget"""
+        with self._lock:
+            self._budget = min(
+                self.budget_max, self._budget + self.budget_ratio)
+
+    def spend_budget(self):
+        """Return whether a request can be hedged, spending the budget"""
+        with self._lock:
+            if self._budget < 1:
+                return False
+            self._budget -= 1
+            return True
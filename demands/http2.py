@@ -0,0 +1,145 @@
+"""HTTP/2 transport adapter
+
+Requires `httpx` with HTTP/2 support, install it with the `http2` extra:
+`pip install demands[http2]`.
+"""
+import os
+
+from requests import ConnectionError, ConnectTimeout, ReadTimeout, Response
+from requests.adapters import BaseAdapter
+from requests.cookies import extract_cookies_to_jar
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers, get_environ_proxies
+from six.moves.http_client import HTTPMessage
+
+
+class _OriginalResponse(object):
+    """Headers of an httpx response, where `requests` looks for cookies"""
+
+    def __init__(self, headers):
+        self.msg = HTTPMessage()
+        for name, value in headers.multi_items():
+            self.msg.add_header(name, value)
+
+
+class _RawResponse(object):
+    """Body of an httpx response, streamed by `Response.iter_content`"""
+
+    def __init__(self, httpx, response):
+        self._httpx = httpx
+        self._response = response
+        self._original_response = _OriginalResponse(response.headers)
+
+    def stream(self, chunk_size=None, decode_content=True):
+        try:
+            for chunk in self._response.iter_bytes(chunk_size):
+                yield chunk
+        except self._httpx.TimeoutException as e:
+            raise ReadTimeout(e)
+        except self._httpx.TransportError as e:
+            raise ConnectionError(e)
+        finally:
+            self._response.close()
+
+    def close(self):
+        self._response.close()
+
+    release_conn = close
+
+
+class HTTP2Adapter(BaseAdapter):
+    """Sends requests with an `httpx.Client`, over HTTP/2 when possible
+
+    Mount it on a client, or create the client with `http2=True`:
+
+        service = HTTPServiceClient(url='https://localhost/', http2=True)
+
+    Requests to hosts that support HTTP/2, over HTTPS, share a single
+    connection per host, with concurrent requests from threads sharing the
+    client, such as prefetched pages, multiplexed over it. Other hosts get
+    HTTP/1.1. Responses are :class:`requests.Response` objects, with the
+    `http_version` of the response.
+
+    The `verify`, `cert` and `proxies` of requests raise `ValueError`, unless
+    they come from the environment: pass them to the adapter as `verify`,
+    `cert` and `proxy`, with any other `httpx.Client` arguments.
+    `max_retries` isn't supported.
+
+    :param http2: Set to `False` to only use HTTP/1.1
+    """
+
+    def __init__(self, http2=True, **client_kwargs):
+        super(HTTP2Adapter, self).__init__()
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError(
+                'HTTP2Adapter requires httpx, '
+                'install it with: pip install demands[http2]')
+        self._httpx = httpx
+        self.client = httpx.Client(http2=http2, **client_kwargs)
+
+    def send(self, request, stream=False, timeout=None, verify=True,
+             cert=None, proxies=None):
+        unsupported = self._get_unsupported(request, verify, cert, proxies)
+        if unsupported:
+            raise ValueError(
+                'Unsupported request params: %s, pass them to the '
+                'HTTP2Adapter instead' % ', '.join(unsupported))
+        httpx = self._httpx
+        httpx_request = self.client.build_request(
+            request.method, request.url, headers=request.headers,
+            content=request.body, timeout=self._get_timeout(timeout))
+        try:
+            httpx_response = self.client.send(httpx_request, stream=True)
+        except httpx.ConnectTimeout as e:
+            raise ConnectTimeout(e, request=request)
+        except httpx.TimeoutException as e:
+            raise ReadTimeout(e, request=request)
+        except httpx.TransportError as e:
+            raise ConnectionError(e, request=request)
+        return self.build_response(request, httpx_response)
+
+    def _get_unsupported(self, request, verify, cert, proxies):
+        """Return the names of params set for the request only
+
+        The CA bundle and proxies `requests` takes from the environment are
+        also used by `httpx`.
+        """
+        unsupported = []
+        env_bundles = (
+            os.environ.get('REQUESTS_CA_BUNDLE'),
+            os.environ.get('CURL_CA_BUNDLE'))
+        if verify is not True and (verify is False or
+                                   verify not in env_bundles):
+            unsupported.append('verify')
+        if cert:
+            unsupported.append('cert')
+        env_proxies = get_environ_proxies(request.url)
+        if any(env_proxies.get(scheme) != proxy
+               for scheme, proxy in (proxies or {}).items()):
+            unsupported.append('proxies')
+        return unsupported
+
+    def _get_timeout(self, timeout):
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return self._httpx.Timeout(read, connect=connect)
+        return self._httpx.Timeout(timeout)
+
+    def build_response(self, request, httpx_response):
+        response = Response()
+        response.status_code = httpx_response.status_code
+        response.headers = CaseInsensitiveDict(httpx_response.headers.items())
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.reason = httpx_response.reason_phrase
+        response.http_version = httpx_response.http_version
+        response.raw = _RawResponse(self._httpx, httpx_response)
+        response.url = request.url
+        extract_cookies_to_jar(response.cookies, request, response.raw)
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        self.client.close()
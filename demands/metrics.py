@@ -0,0 +1,192 @@
+import math
+import re
+import threading
+import time
+
+# monotonic clock for durations, time.monotonic isn't available on Python 2
+monotonic = getattr(time, 'monotonic', time.time)
+
+ID_SEGMENT_RE = re.compile(r'/\d+(?=/|$)')
+
+
+def get_path_template(path):
+    """Return `path` with numeric segments replaced by `{id}`
+
+        >>> get_path_template('/users/1234/posts/5')
+        '/users/{id}/posts/{id}'
+    """
+    return ID_SEGMENT_RE.sub('/{id}', path or '/')
+
+
+class RequestEvent(object):
+    """Timing and size of a request, passed to the `metrics` hook
+
+    :ivar method: HTTP method
+    :ivar path_template: The `path_template` param of the request, or its
+        path with numeric segments replaced by `{id}`
+    :ivar url: URL of the request
+    :ivar status_code: Status code of the response, `None` for errors
+    :ivar duration: Seconds from sending the request to receiving the body of
+        the response, including retries
+    :ivar ttfb: Seconds from sending the last attempt to receiving the
+        headers of its response, including connecting. `None` if the
+        transport doesn't report it
+    :ivar download: Seconds spent receiving the body of the last response,
+        `None` for streamed responses or if `ttfb` is `None`
+    :ivar bytes_sent: Size of the request body, `None` if unknown
+    :ivar bytes_received: Size of the response body, from `Content-Length`
+        for streamed responses. `None` if unknown
+    :ivar retries: Retries made by the `retry_policy`
+    :ivar from_cache: `True` if the response was served from the `cache`
+    :ivar error: Exception raised by the transport, if any
+    """
+
+    def __init__(self, method, path_template, url, status_code=None,
+                 duration=0, ttfb=None, download=None, bytes_sent=0,
+                 bytes_received=None, retries=0, from_cache=False,
+                 error=None):
+        self.method = method
+        self.path_template = path_template
+        self.url = url
+        self.status_code = status_code
+        self.duration = duration
+        self.ttfb = ttfb
+        self.download = download
+        self.bytes_sent = bytes_sent
+        self.bytes_received = bytes_received
+        self.retries = retries
+        self.from_cache = from_cache
+        self.error = error
+
+    def __repr__(self):
+        return '<RequestEvent %s %s %s %.2fms>' % (
+            self.method, self.path_template, self.status_code,
+            self.duration * 1000)
+
+
+class LatencyHistogram(object):
+    """Counts latencies in buckets growing by `growth`, from `min_value`
+
+    Percentiles are the upper bound of their bucket, so they are at most
+    `growth - 1` (5% by default) above the exact value, and memory doesn't
+    grow with the number of latencies:
+
+        >>> histogram = LatencyHistogram()
+        >>> for latency in range(1, 101):
+        ...     histogram.add(latency / 1000.0)
+        >>> 0.050 <= histogram.percentile(50) <= 0.050 * 1.05
+        True
+    """
+
+    def __init__(self, min_value=0.0001, growth=1.05):
+        self.min_value = min_value
+        self.growth = growth
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._log_growth = math.log(growth)
+        self._buckets = {}
+
+    def add(self, value):
+        bucket = 0
+        if value > self.min_value:
+            bucket = int(math.ceil(
+                math.log(value / self.min_value) / self._log_growth))
+        self._buckets[bucket] = self._buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def percentile(self, percent):
+        """Return the latency `percent`% of latencies are at most"""
+        if not self.count:
+            return None
+        rank = max(1, int(math.ceil(self.count * percent / 100.0)))
+        seen = 0
+        for bucket in sorted(self._buckets):
+            seen += self._buckets[bucket]
+            if seen >= rank:
+                break
+        return min(self.min_value * self.growth ** bucket, self.max)
+
+
+class EndpointStats(object):
+    """Requests to an endpoint, aggregated by `MetricsAggregator`"""
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.errors = 0
+        self.retries = 0
+        self.cache_hits = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    @property
+    def count(self):
+        return self.latency.count
+
+    def add(self, event):
+        self.latency.add(event.duration)
+        if event.error is not None or (event.status_code or 0) >= 500:
+            self.errors += 1
+        self.retries += event.retries
+        self.cache_hits += int(event.from_cache)
+        self.bytes_sent += event.bytes_sent or 0
+        self.bytes_received += event.bytes_received or 0
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'retries': self.retries,
+            'cache_hits': self.cache_hits,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'mean': self.latency.mean,
+            'max': self.latency.max,
+            'p50': self.latency.percentile(50),
+            'p95': self.latency.percentile(95),
+            'p99': self.latency.percentile(99),
+        }
+
+
+class MetricsAggregator(object):
+    """Aggregates request events by method and path template, in process
+
+    Pass an instance to a service client as the `metrics` param, and read
+    latency percentiles, in seconds, error and retry counts per endpoint
+    with `stats`:
+
+        metrics = MetricsAggregator()
+        service = HTTPServiceClient(url='http://localhost/', metrics=metrics)
+        ...
+        for (method, path), stats in metrics.stats().items():
+            log.info('%s %s p99: %.3fs', method, path, stats['p99'])
+    """
+
+    def __init__(self):
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        key = (event.method, event.path_template)
+        with self._lock:
+            stats = self._endpoints.get(key)
+            if stats is None:
+                stats = self._endpoints[key] = EndpointStats()
+            stats.add(event)
+
+    def stats(self):
+        """Return a dict of stats by `(method, path_template)`"""
+        with self._lock:
+            return dict(
+                (key, stats.as_dict())
+                for key, stats in self._endpoints.items())
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
@@ -1,4 +1,13 @@
-from itertools import count
+import time
+from collections import deque
+from itertools import count, islice
+from multiprocessing.pool import ThreadPool
+
+from requests import Response, Timeout
+
+from demands import HTTPServiceError, _imap_bounded
+from demands.deadline import DeadlineExceeded, bind, check_deadline
+from demands.streaming import JSONItemStream
 
 
 PAGE_PARAM = 'page_param'
@@ -8,11 +17,25 @@ PAGINATION_TYPE = 'pagination_type'
 RESULTS_KEY = 'results_key'
 NEXT_KEY = 'next_key'
 START = 'start'
+PREFETCH = 'prefetch'
+COUNT_KEY = 'count_key'
+ORDERED = 'ordered'
+STREAM = 'stream'
+STREAM_CHUNK_SIZE = 'stream_chunk_size'
+ADAPTIVE = 'adaptive'
+MIN_PAGE_SIZE = 'min_page_size'
+MAX_PAGE_SIZE = 'max_page_size'
+MAX_PAGE_LATENCY = 'max_page_latency'
+MAX_PAGE_BYTES = 'max_page_bytes'
+RESUME = 'resume'
+CHECKPOINT = 'checkpoint'
+CHECKPOINT_PAGES = 'checkpoint_pages'
 
 
 class PaginationType(object):
     ITEM = 'item'
     PAGE = 'page'
+    CURSOR = 'cursor'
 
 
 class PaginatedResults(object):
@@ -77,6 +100,110 @@ class PaginatedResults(object):
         >>> list(results)
         [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, ... 99]
 
+    Pages are fetched one at a time by default. Set `prefetch` to the number
+    of pages that should be fetched ahead of the consumer by a pool of
+    threads. Items are still returned in order, and pages fetched past the
+    last page are discarded. Cursor pages can't be fetched ahead:
+
+        >>> results = PaginatedResults(
+        ...     numbers, page_param='offset', page_size_param='limit',
+        ...     page_size=10, pagination_type=PaginationType.ITEM, prefetch=4)
+        >>> list(results)
+        [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, ... 99]
+
+    When prefetching, if the first page reports the total number of items
+    under `count_key` (which defaults to 'count'), only the counted pages are
+    fetched, still up to `prefetch` pages ahead of the consumer.
+    Set `ordered` to `False` to get their items as soon as each page arrives,
+    rather than in order:
+
+        >>> def numbers(page, page_size):
+        ...    start = (page - 1) * page_size
+        ...    end = start + page_size
+        ...    return {'results': range(0, 100)[start:end], 'count': 100}
+        ...
+        >>> results = PaginatedResults(
+        ...     numbers, page_size=10, prefetch=4, ordered=False)
+        >>> sorted(results)
+        [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, ... 99]
+
+    Set `pagination_type` to `PaginationType.CURSOR` if the API returns the
+    cursor, or URL, of the next page under `next_key`, to pass it back as the
+    `page_param`. The first page is fetched without a `page_param`, unless
+    `start` is set.
+    The paginated function can also return a :class:`requests.Response`, to
+    follow the `next` URL of its `Link` header when there is no `next_key`:
+
+        >>> def numbers(cursor=None, page_size=10):
+        ...     start = int(cursor or 0)
+        ...     end = start + page_size
+        ...     next_cursor = str(end) if end < 100 else None
+        ...     return {'results': range(100)[start:end], 'next': next_cursor}
+        ...
+        >>> results = PaginatedResults(
+        ...     numbers, page_param='cursor',
+        ...     pagination_type=PaginationType.CURSOR)
+        >>> list(results)
+        [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, ... 99]
+
+    Set `stream` to `True` to decode the items of each page as they are
+    downloaded, rather than holding whole pages in memory. The paginated
+    function should then return a streamed :class:`requests.Response`:
+
+        class MyService(HTTPServiceClient):
+            def get_users(self, page, page_size):
+                return self.get('/users/', stream=True, params={
+                    'page': page, 'page_size': page_size})
+
+        users = PaginatedResults(service.get_users, stream=True)
+
+    Set `adaptive` to `True` to adjust the page size to the API, with
+    `ITEM` or `CURSOR` pagination. Starting from `page_size`, the page size
+    doubles while the time per item falls, as long as pages take less than
+    `max_page_latency` seconds and, for paginated functions returning
+    responses, are smaller than `max_page_bytes`. It halves when a page goes
+    over those limits, times out or fails with a 5xx error, and failed pages
+    are fetched again. The page size stays between `min_page_size` and
+    `max_page_size`. Adaptive pages are fetched one at a time.
+
+    The `position` of the results is the page, or cursor, of the next item to
+    be returned and the offset of that item in the page. Pass it as `resume`
+    to continue from there, for example after a crash. Set `checkpoint` to a
+    function to call with the `position` every `checkpoint_pages` pages:
+
+        >>> def numbers(page, page_size):
+        ...    start = (page - 1) * page_size
+        ...    end = start + page_size
+        ...    return {'results': range(0, 95)[start:end]}
+        ...
+        >>> positions = []
+        >>> results = PaginatedResults(
+        ...     numbers, page_size=10, checkpoint=positions.append,
+        ...     checkpoint_pages=4)
+        >>> list(results)
+        [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, ... 94]
+        >>> [(position['page'], position['offset']) for position in positions]
+        [(5, 0), (9, 0), (10, 5)]
+        >>> results = PaginatedResults(
+        ...     numbers, page_size=10, resume={'page': 9, 'offset': 7})
+        >>> list(results)
+        [87, 88, 89, 90, 91, 92, 93, 94]
+
+    Pages aren't returned in order with `ordered` set to `False`, so
+    `resume` and `checkpoint` can't be used with it.
+
+    Pages aren't fetched once the deadline of a `demands.deadline.deadline`
+    block has passed. `DeadlineExceeded` is raised instead, and the
+    `position` can be used to resume later:
+
+        >>> from demands.deadline import DeadlineExceeded, deadline
+        >>> results = PaginatedResults(numbers, page_size=10)
+        >>> with deadline(0):  # doctest: +IGNORE_EXCEPTION_DETAIL
+        ...     list(results)
+        Traceback (most recent call last):
+          ...
+        DeadlineExceeded: Deadline exceeded by 0.00s
+
     """
     DEFAULT_OPTIONS = {
         PAGE_PARAM: 'page',
@@ -85,6 +212,19 @@ class PaginatedResults(object):
         PAGINATION_TYPE: PaginationType.PAGE,
         RESULTS_KEY: 'results',
         NEXT_KEY: 'next',
+        PREFETCH: 0,
+        COUNT_KEY: 'count',
+        ORDERED: True,
+        STREAM: False,
+        STREAM_CHUNK_SIZE: 64 * 1024,
+        ADAPTIVE: False,
+        MIN_PAGE_SIZE: 10,
+        MAX_PAGE_SIZE: 1000,
+        MAX_PAGE_LATENCY: 5,
+        MAX_PAGE_BYTES: None,
+        RESUME: None,
+        CHECKPOINT: None,
+        CHECKPOINT_PAGES: 1,
     }
 
     def __init__(self, paginated_fn, args=(), kwargs=None, **options):
@@ -93,38 +233,284 @@ class PaginatedResults(object):
         self.kwargs = kwargs or {}
         self.options = dict(self.DEFAULT_OPTIONS)
         self.options.update(options)
+        if not self.options[ORDERED] and (
+                self.options[RESUME] or self.options[CHECKPOINT]):
+            raise ValueError(
+                'resume and checkpoint require ordered pages')
+        self._started = False
+        self._position_page = None
+        self._position_offset = 0
+
+    @property
+    def position(self):
+        """The page and offset in the page of the next item to return"""
+        if not self._started:
+            return self.options[RESUME]
+        return {'page': self._position_page, 'offset': self._position_offset}
 
     def __iter__(self):
+        skip = self._resume_offset()
+        for page_number, page in enumerate(self._iter_pages(), 1):
+            self._start_page(page, skip)
+            for item in islice(page.items, skip, None):
+                self._position_offset += 1
+                yield item
+            skip = 0
+            self._finish_page(page, page_number)
+
+    def iter_pages(self):
+        """Return the pages of results, as `Page` objects
+
+        When resuming, pages are returned whole, from the page of the
+        `position`.
+        """
+        self._resume_offset()
+        for page_number, page in enumerate(self._iter_pages(), 1):
+            self._start_page(page)
+            yield page
+            self._position_offset = page.size
+            self._finish_page(page, page_number)
+
+    def iter_batches(self, size):
+        """Return lists of `size` items, the last list may be shorter"""
+        batch = []
+        for page in self.iter_pages():
+            batch.extend(page.items)
+            while len(batch) >= size:
+                yield batch[:size]
+                del batch[:size]
+        if batch:
+            yield batch
+
+    def _resume_offset(self):
+        resume = self.options[RESUME]
+        self._started = False
+        return resume['offset'] if resume else 0
+
+    def _start_page(self, page, offset=0):
+        self._started = True
+        self._position_page = page.page_id
+        self._position_offset = offset
+
+    def _start_page_id(self, default=None):
+        resume = self.options[RESUME]
+        if resume:
+            return resume['page']
+        return self.options.get(START, default)
+
+    def _finish_page(self, page, page_number):
+        if not page.is_last_page:
+            self._position_page = self._next_page_id(page)
+            self._position_offset = 0
+        checkpoint = self.options[CHECKPOINT]
+        if checkpoint and (
+                page_number % self.options[CHECKPOINT_PAGES] == 0 or
+                page.is_last_page):
+            checkpoint(self.position)
+
+    def _next_page_id(self, page):
+        pagination_type = self.options[PAGINATION_TYPE]
+        if pagination_type == PaginationType.PAGE:
+            return page.page_id + 1
+        if pagination_type == PaginationType.ITEM:
+            return page.page_id + page.size
+        return page.next_cursor
+
+    def _iter_pages(self):
+        if self.options[ADAPTIVE]:
+            return self._adaptive_pages()
+        if self.options[PAGINATION_TYPE] == PaginationType.CURSOR:
+            return self._cursor_pages()
+        if self.options[PREFETCH]:
+            return self._concurrent_pages()
+        return self._sequential_pages()
+
+    def _cursor_pages(self):
+        cursor = self._start_page_id()
+        while True:
+            page = self._get_page(cursor)
+            yield page
+            if page.is_last_page:
+                return
+            cursor = page.next_cursor
+
+    def _adaptive_pages(self):
+        pagination_type = self.options[PAGINATION_TYPE]
+        if pagination_type == PaginationType.ITEM:
+            page_id = self._start_page_id(0)
+        elif pagination_type == PaginationType.CURSOR:
+            page_id = self._start_page_id()
+        else:
+            raise ValueError(
+                'adaptive requires ITEM or CURSOR pagination_type')
+
+        page_size = _AdaptivePageSize(self.options)
+        while True:
+            start_time = time.time()
+            try:
+                page = self._get_page(page_id, page_size.size)
+                page.size  # fetch streamed pages whole, to time them
+            except (Timeout, HTTPServiceError) as e:
+                # a smaller page won't help client errors, or open circuits
+                client_error = (
+                    isinstance(e, HTTPServiceError) and (
+                        e.response is None or e.response.status_code < 500))
+                if (client_error or isinstance(e, DeadlineExceeded) or
+                        not page_size.shrink()):
+                    raise
+                continue
+            page_size.record(page, time.time() - start_time)
+            yield page
+            if page.is_last_page:
+                return
+            if pagination_type == PaginationType.ITEM:
+                page_id += page.size
+            else:
+                page_id = page.next_cursor
+
+    def _sequential_pages(self):
         for page_id in self._page_ids():
             page = self._get_page(page_id)
-            for item in page.items:
-                yield item
+            yield page
             if page.is_last_page:
                 return
 
-    def _get_page(self, page):
-        kwargs = dict(self.kwargs)
-        kwargs.update({
-            self.options[PAGE_PARAM]: page,
-            self.options[PAGE_SIZE_PARAM]: self.options[PAGE_SIZE],
-        })
+    def _concurrent_pages(self):
+        page_ids = self._page_ids()
+        first_page = self._get_page(next(page_ids))
+        yield first_page
+        if first_page.is_last_page:
+            return
+
+        pool = ThreadPool(self.options[PREFETCH])
+        get_page = bind(self._get_page)
+        try:
+            if first_page.total_count is None:
+                pages = self._prefetch_pages(pool, get_page, page_ids)
+            else:
+                pages = self._fan_out_pages(
+                    pool, get_page, self._remaining_page_ids(
+                        first_page.page_id, first_page.total_count))
+            for page in pages:
+                yield page
+        finally:
+            # pages fetched speculatively past the last page are discarded
+            pool.terminate()
+
+    def _prefetch_pages(self, pool, get_page, page_ids):
+        pending = deque(
+            pool.apply_async(get_page, (page_id,))
+            for page_id in islice(page_ids, self.options[PREFETCH]))
+        while pending:
+            page = pending.popleft().get()
+            yield page
+            if page.is_last_page:
+                return
+            for page_id in islice(page_ids, 1):
+                pending.append(pool.apply_async(get_page, (page_id,)))
+
+    def _fan_out_pages(self, pool, get_page, page_ids):
+        return _imap_bounded(
+            pool, get_page, page_ids, self.options[PREFETCH],
+            self.options[ORDERED])
+
+    def _get_page(self, page, page_size=None):
+        check_deadline()
+        options = self.options
+        if page_size is not None:
+            options = dict(options, page_size=page_size)
+        kwargs = self._page_kwargs(page, page_size)
+        start_time = time.time()
         one_page_data = self.paginated_fn(*self.args, **kwargs)
-        return Page(one_page_data, self.options)
+        if options[STREAM]:
+            page = StreamedPage(one_page_data, options, page_id=page)
+        else:
+            page = Page(one_page_data, options, page_id=page)
+        page.latency = time.time() - start_time
+        return page
+
+    def _page_kwargs(self, page, page_size=None):
+        kwargs = dict(self.kwargs)
+        kwargs[self.options[PAGE_SIZE_PARAM]] = (
+            page_size or self.options[PAGE_SIZE])
+        if page is not None:
+            kwargs[self.options[PAGE_PARAM]] = page
+        return kwargs
 
     def _page_ids(self):
         if self.options[PAGINATION_TYPE] == PaginationType.PAGE:
-            start = self.options.get(START, 1)
+            start = self._start_page_id(1)
             return count(start)
         if self.options[PAGINATION_TYPE] == PaginationType.ITEM:
-            start = self.options.get(START, 0)
+            start = self._start_page_id(0)
             return count(start, self.options[PAGE_SIZE])
         raise ValueError('Unknown pagination_type')
 
+    def _remaining_page_ids(self, page_id, total_count):
+        page_size = self.options[PAGE_SIZE]
+        if self.options[PAGINATION_TYPE] == PaginationType.PAGE:
+            start = self.options.get(START, 1)
+            page_count = (total_count + page_size - 1) // page_size
+            return range(page_id + 1, start + page_count)
+        if self.options[PAGINATION_TYPE] == PaginationType.ITEM:
+            return range(page_id + page_size, total_count, page_size)
+        raise ValueError('Unknown pagination_type')
+
+
+class _AdaptivePageSize(object):
+    """Page size adjusted to the time and size of fetched pages"""
+
+    def __init__(self, options):
+        self.min_size = options[MIN_PAGE_SIZE]
+        self.max_size = options[MAX_PAGE_SIZE]
+        self.max_latency = options[MAX_PAGE_LATENCY]
+        self.max_bytes = options[MAX_PAGE_BYTES]
+        self.size = max(self.min_size, min(options[PAGE_SIZE], self.max_size))
+        self._item_latency = None
+
+    def record(self, page, latency):
+        too_big = (
+            self.max_bytes and page.byte_size and
+            page.byte_size > self.max_bytes)
+        if latency > self.max_latency or too_big:
+            self.shrink()
+            return
+        if not page.size:
+            return
+
+        item_latency = latency / page.size
+        if self._item_latency is None or item_latency <= self._item_latency:
+            self.size = min(self.size * 2, self.max_size)
+        self._item_latency = item_latency
+
+    def shrink(self):
+        """Halve the page size, return `False` if it is already the minimum"""
+        if self.size <= self.min_size:
+            return False
+        self.size = max(self.size // 2, self.min_size)
+        self._item_latency = None
+        return True
+
 
 class Page(object):
-    def __init__(self, data, options):
+    """A page of paginated results
+
+    Besides its `items`, a page has its `page_id`, the `latency` of fetching
+    it in seconds, and its `byte_size` if the paginated function returned a
+    response.
+    """
+
+    def __init__(self, data, options, page_id=None):
+        self.links = {}
+        self.byte_size = None
+        self.latency = None
+        if isinstance(data, Response):
+            self.links = data.links
+            self.byte_size = len(data.content)
+            data = data.json()
         self._data = data
         self._options = options
+        self.page_id = page_id
 
     @property
     def items(self):
@@ -137,11 +523,78 @@ class Page(object):
     def size(self):
         return len(self.items)
 
+    @property
+    def total_count(self):
+        count_key = self._options.get(COUNT_KEY)
+        if count_key and isinstance(self._data, dict):
+            return self._data.get(count_key)
+
+    @property
+    def next_cursor(self):
+        next_key = self._options.get(NEXT_KEY)
+        if isinstance(self._data, dict) and next_key in self._data:
+            return self._data[next_key]
+        return self.links.get('next', {}).get('url')
+
     @property
     def is_last_page(self):
+        if self._options[PAGINATION_TYPE] == PaginationType.CURSOR:
+            return self.next_cursor is None
+
         next_key = self._options.get(NEXT_KEY)
 
         if next_key in self._data:
             return self._data[next_key] is None
 
         return self.size < self._options[PAGE_SIZE]
+
+
+class StreamedPage(Page):
+    """A page of items decoded from a streamed response as they are iterated
+
+    The rest of the page's data, such as the next key, is only known once
+    all of the items are iterated. If it's needed earlier, the remaining
+    items are decoded and held in memory.
+    """
+
+    def __init__(self, response, options, page_id=None):
+        super(StreamedPage, self).__init__({}, options, page_id=page_id)
+        self.links = response.links
+        content_length = response.headers.get('Content-Length')
+        if content_length:
+            self.byte_size = int(content_length)
+        self._stream = JSONItemStream(
+            response.iter_content(options[STREAM_CHUNK_SIZE]),
+            options.get(RESULTS_KEY))
+        self._items = None
+
+    @property
+    def items(self):
+        if self._items is not None:
+            return self._items
+        return self._stream
+
+    def _finish_stream(self):
+        if not self._stream.finished:
+            self._items = list(self._stream)
+        self._data = self._stream.data
+
+    @property
+    def size(self):
+        self._finish_stream()
+        return self._stream.count
+
+    @property
+    def total_count(self):
+        self._finish_stream()
+        return super(StreamedPage, self).total_count
+
+    @property
+    def next_cursor(self):
+        self._finish_stream()
+        return super(StreamedPage, self).next_cursor
+
+    @property
+    def is_last_page(self):
+        self._finish_stream()
+        return super(StreamedPage, self).is_last_page
@@ -0,0 +1,108 @@
+import random
+import threading
+import time
+from email.utils import mktime_tz, parsedate_tz
+
+
+class RetryPolicy(object):
+    """Retries responses with selected status codes, with backoff
+
+    Pass an instance to a service client as the `retry_policy` param, shared
+    by all of its requests or for a single request:
+
+        service = HTTPServiceClient(
+            url='http://localhost/', retry_policy=RetryPolicy(retries=3))
+
+    Retries wait for an exponential backoff with full jitter, or for the
+    delay in the `Retry-After` header of the response. Only requests with
+    idempotent methods are retried.
+
+    Retries are limited by a budget, shared by all requests using the policy,
+    so that they can't multiply the load on a failing service. Every request
+    adds `budget_ratio` to the budget, up to `budget_max`, and every retry
+    spends one.
+
+    :param retries: Maximum number of retries for a request
+    :param status_codes: Status codes of responses to retry
+    :param methods: HTTP methods of requests to retry
+    :param backoff_factor: Backoff for the first retry, in seconds. Doubles
+        with each retry
+    :param max_backoff: Longest backoff, in seconds, including `Retry-After`
+    :param jitter: Wait a random time up to the backoff, rather than for the
+        whole backoff
+    :param respect_retry_after: Wait for the delay in `Retry-After` headers
+    :param budget_ratio: Retries allowed for each request
+    :param budget_max: Retries the budget can hold, which is also the initial
+        budget
+    """
+
+    RETRY_STATUS_CODES = frozenset([429, 502, 503, 504])
+    IDEMPOTENT_METHODS = frozenset(
+        ['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE', 'TRACE'])
+
+    def __init__(self, retries=3, status_codes=RETRY_STATUS_CODES,
+                 methods=IDEMPOTENT_METHODS, backoff_factor=0.1,
+                 max_backoff=10, jitter=True, respect_retry_after=True,
+                 budget_ratio=0.2, budget_max=10):
+        self.retries = retries
+        self.status_codes = frozenset(status_codes)
+        self.methods = frozenset(method.upper() for method in methods)
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.respect_retry_after = respect_retry_after
+        self.budget_ratio = budget_ratio
+        self.budget_max = budget_max
+        self._budget = float(budget_max)
+        self._lock = threading.Lock()
+
+    def get_delay(self, method, response, retry, max_delay=None):
+        """Return the seconds to wait before `retry`, or `None` to not retry
+
+        :param retry: Number of the retry, starting at 1
+        :param max_delay: (optional) Seconds the retry has to be sent in,
+            such as the time left to a deadline. Retries that would wait
+            longer aren't made, and don't spend the budget
+        """
+        if (retry > self.retries or
+                response.status_code not in self.status_codes or
+                method.upper() not in self.methods):
+            return None
+
+        delay = self._get_retry_after(response)
+        if delay is None:
+            delay = self.backoff_factor * 2 ** (retry - 1)
+            if self.jitter:
+                delay = random.uniform(0, delay)
+        delay = max(0, min(delay, self.max_backoff))
+        if max_delay is not None and delay >= max_delay:
+            return None
+        if not self._spend_budget():
+            return None
+        return delay
+
+    def add_request(self):
+        """Add a request's share of retries to the budget"""
+        with self._lock:
+            self._budget = min(
+                self.budget_max, self._budget + self.budget_ratio)
+
+    def _spend_budget(self):
+        with self._lock:
+            if self._budget < 1:
+                return False
+            self._budget -= 1
+            return True
+
+    def _get_retry_after(self, response):
+        retry_after = response.headers.get('Retry-After')
+        if not self.respect_retry_after or not retry_after:
+            return None
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+        date = parsedate_tz(retry_after)
+        if date is None:
+            return None
+        return mktime_tz(date) - time.time()
@@ -0,0 +1,130 @@
+import codecs
+import json
+
+WHITESPACE = ' \t\n\r'
+
+
+class JSONItemStream(object):
+    """Iterates over the items of a JSON array, decoding them incrementally
+
+    Decodes the items of the array under `key` in a JSON object, or of a
+    top-level array if `key` is `None`, from an iterable of UTF-8 encoded
+    chunks, such as `response.iter_content()`. Only one item is held in
+    memory at a time.
+
+        >>> stream = JSONItemStream(
+        ...     [b'{"results": [1, [2', b', 3], 45', b'6], "next": null}'],
+        ...     key='results')
+        >>> list(stream)
+        [1, [2, 3], 456]
+
+    Once all of the items are iterated, the rest of the object is available
+    as `data`:
+
+        >>> stream.data['next'] is None
+        True
+    """
+
+    def __init__(self, chunks, key=None):
+        self.key = key
+        self.data = {}
+        self.count = 0
+        self.finished = False
+        self._chunks = iter(chunks)
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json_decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._exhausted = False
+        self._items = self._parse()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._items)
+
+    next = __next__
+
+    def _read(self):
+        """Add the next chunk to the buffer, return `False` if there is none"""
+        if self._exhausted:
+            return False
+        try:
+            chunk = next(self._chunks)
+            text = self._text_decoder.decode(chunk)
+        except StopIteration:
+            self._exhausted = True
+            text = self._text_decoder.decode(b'', True)
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        return True
+
+    def _peek(self):
+        """Return the next character that isn't whitespace"""
+        while True:
+            while (self._pos < len(self._buffer) and
+                    self._buffer[self._pos] in WHITESPACE):
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._read():
+                raise ValueError('Unexpected end of JSON data')
+
+    def _expect(self, chars):
+        char = self._peek()
+        if char not in chars:
+            raise ValueError(
+                'Expected %s at position %d' % (' or '.join(chars), self._pos))
+        self._pos += 1
+        return char
+
+    def _decode_value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self._json_decoder.raw_decode(
+                    self._buffer, self._pos)
+            except ValueError:
+                if not self._read():
+                    raise
+                continue
+            # a number at the end of the buffer may continue in the next chunk
+            if end < len(self._buffer) or not self._read():
+                self._pos = end
+                return value
+
+    def _parse(self):
+        if self.key is None:
+            for item in self._parse_array():
+                yield item
+            self.finished = True
+            return
+
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+        else:
+            while True:
+                key = self._decode_value()
+                self._expect(':')
+                if key == self.key:
+                    for item in self._parse_array():
+                        yield item
+                else:
+                    self.data[key] = self._decode_value()
+                if self._expect(',}') == '}':
+                    break
+        self.finished = True
+
+    def _parse_array(self):
+        self._expect('[')
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            item = self._decode_value()
+            self.count += 1
+            yield item
+            if self._expect(',]') == ']':
+                return
@@ -0,0 +1,57 @@
+import threading
+import time
+
+from demands.metrics import monotonic
+
+
+class RateLimiter(object):
+    """Limits requests to `rate` per second, with a token bucket
+
+    Pass an instance to a service client as the `rate_limiter` param, shared
+    by all of its requests, or by several clients of the same service:
+
+        service = HTTPServiceClient(
+            url='http://localhost/', rate_limiter=RateLimiter(rate=10))
+
+    Requests wait for a token before being sent, retries included. The
+    bucket holds up to `burst` tokens, so that `burst` requests can be sent
+    at once after an idle period. Waiting requests are sent in the order
+    they took their tokens.
+
+    :param rate: Requests per second
+    :param burst: Requests that can be sent at once
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_delay=None):
+        """Take a token and return the seconds to wait before sending
+
+        Returns `None`, without taking a token, if the wait would be longer
+        than `max_delay` seconds.
+        """
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(
+                self.burst,
+                self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            delay = max(0, (1 - self._tokens) / self.rate)
+            if max_delay is not None and delay > max(0, max_delay):
+                return None
+            self._tokens -= 1
+            return delay
+
+    def acquire(self, timeout=None):
+        """Wait for a token, return `False` if it takes over `timeout`"""
+        delay = self.reserve(max_delay=timeout)
+        if delay is None:
+            return False
+        if delay:
+            time.sleep(delay)
+        return True
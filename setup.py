@@ -22,6 +22,10 @@ setup(
         'requests >= 2.4.2, < 3.0.0',
         'six',
     ],
+    extras_require={
+        'aio': ['aiohttp'],
+        'http2': ['httpx[http2]'],
+    },
     test_suite='nose.collector',
     classifiers=[
         'Development Status :: 5 - Production/Stable',
@@ -0,0 +1,474 @@
+import asyncio
+from datetime import timedelta
+from unittest import TestCase, skipIf
+
+from mock import Mock
+from requests import ConnectionError, ReadTimeout, Response
+
+from demands import HTTPServiceError
+from demands.aio import (
+    AsyncHTTPServiceClient, AsyncPaginatedResults, HttpxTransport)
+from demands.breaker import CircuitBreaker, CircuitOpenError
+from demands.deadline import DeadlineExceeded, deadline
+from demands.hedge import HedgePolicy
+from demands.pagination import PaginationType
+from demands.retry import RetryPolicy
+from demands.throttle import RateLimiter
+
+try:
+    import aiohttp
+    import aiohttp.test_utils
+    import aiohttp.web
+except ImportError:
+    aiohttp = None
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+class AsyncTestCase(TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_async(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+
+class AsyncHttpServiceTests(AsyncTestCase):
+    def setUp(self):
+        super(AsyncHttpServiceTests, self).setUp()
+        self.response = Mock(spec=Response(), status_code=200)
+        self.requests = []
+        self.service = AsyncHTTPServiceClient(
+            'http://service.com/', transport=self.transport,
+            headers={'name': 'value'})
+
+    async def transport(self, **kwargs):
+        self.requests.append(kwargs)
+        return self.response
+
+    def test_returning_responses_from_all_calls(self):
+        for method in ('get', 'put', 'delete', 'post', 'patch', 'options',
+                       'head'):
+            response = self.run_async(getattr(self.service, method)('/path'))
+            self.assertEqual(response, self.response)
+
+    def test_get_request_with_params(self):
+        self.run_async(self.service.get(
+            '/get-endpoint', params={'foo': 'bar'},
+            headers={'other': 'value'}, expected_response_codes=(404,)))
+        self.assertEqual(self.requests, [{
+            'method': 'GET', 'url': 'http://service.com/get-endpoint',
+            'allow_redirects': True, 'params': {'foo': 'bar'},
+            'headers': {'name': 'value', 'other': 'value'},
+        }])
+
+    def test_unacceptable_response(self):
+        self.response.configure_mock(
+            url='http://broken/', status_code=500, content='content')
+        self.response.json.side_effect = ValueError
+        with self.assertRaises(HTTPServiceError) as e:
+            self.run_async(self.service.get('/'))
+        self.assertEqual(e.exception.details, 'content')
+
+    def test_expected_response_codes_are_acceptable(self):
+        self.response.configure_mock(status_code=404)
+        response = self.run_async(
+            self.service.get('/', expected_response_codes=(404,)))
+        self.assertFalse(response.is_ok)
+
+    def test_hooks_are_called(self):
+        self.service.pre_send = lambda params: dict(params, timeout=5)
+        self.service.post_send = lambda response, **kwargs: kwargs['timeout']
+        self.assertEqual(self.run_async(self.service.get('/')), 5)
+        self.assertEqual(self.requests[0]['timeout'], 5)
+
+    def test_retries_responses_with_retry_policy(self):
+        failed = Mock(spec=Response(), status_code=503, headers={})
+        responses = [failed, self.response]
+
+        async def transport(**kwargs):
+            return responses.pop(0)
+        self.service.transport = transport
+
+        response = self.run_async(self.service.get(
+            '/', retry_policy=RetryPolicy(backoff_factor=0)))
+        self.assertEqual(response, self.response)
+        self.assertEqual(responses, [])
+
+    def test_reports_requests_to_metrics(self):
+        self.response.configure_mock(
+            content=b'{}', headers={}, elapsed=timedelta(seconds=0.01))
+        events = []
+        self.run_async(self.service.get('/users/1', metrics=events.append))
+        self.assertEqual(events[0].path_template, '/users/{id}')
+        self.assertEqual(events[0].status_code, 200)
+        self.assertEqual(events[0].bytes_received, 2)
+        self.assertEqual(events[0].ttfb, 0.01)
+
+    def test_reports_bytes_sent_to_metrics(self):
+        self.response.configure_mock(
+            content=b'{}', headers={}, elapsed=timedelta(seconds=0.01),
+            request=None)
+        events = []
+        self.run_async(self.service.get('/users/1', metrics=events.append))
+        self.run_async(self.service.post(
+            '/users/', data=b'body', metrics=events.append))
+        self.run_async(self.service.post(
+            '/users/', json={'name': 'value'}, metrics=events.append))
+        self.assertEqual(
+            [event.bytes_sent for event in events], [0, 4, None])
+
+    def test_fails_fast_while_circuit_is_open(self):
+        self.response.configure_mock(status_code=503, url='http://broken/')
+        breaker = CircuitBreaker(failures=1)
+        with self.assertRaises(HTTPServiceError):
+            self.run_async(self.service.get('/', circuit_breaker=breaker))
+        with self.assertRaises(CircuitOpenError):
+            self.run_async(self.service.get('/', circuit_breaker=breaker))
+        self.assertEqual(len(self.requests), 1)
+
+    def test_does_not_wait_to_send_past_deadline(self):
+        release = asyncio.Event()
+
+        async def transport(**kwargs):
+            self.requests.append(kwargs)
+            await release.wait()
+            return self.response
+        service = AsyncHTTPServiceClient(
+            'http://service.com/', transport=transport, max_in_flight=1)
+        rate_limiter = RateLimiter(rate=1)
+
+        async def get_with_deadline(**kwargs):
+            with deadline(0.05):
+                await service.get('/path', **kwargs)
+
+        async def get_all():
+            slow = asyncio.ensure_future(service.get('/slow'))
+            await asyncio.sleep(0)
+            with self.assertRaises(DeadlineExceeded):
+                await asyncio.wait_for(get_with_deadline(), 1)
+            release.set()
+            await slow
+            await service.get('/path', rate_limiter=rate_limiter)
+            with self.assertRaises(DeadlineExceeded):
+                await get_with_deadline(rate_limiter=rate_limiter)
+        self.run_async(get_all())
+        self.assertEqual(len(self.requests), 2)
+
+    def test_throttles_requests(self):
+        running = []
+        most_running = []
+
+        async def transport(**kwargs):
+            running.append(kwargs)
+            most_running.append(len(running))
+            await asyncio.sleep(0.01)
+            running.remove(kwargs)
+            return self.response
+        service = AsyncHTTPServiceClient(
+            'http://service.com/', transport=transport, max_in_flight=2,
+            rate_limiter=RateLimiter(rate=1000, burst=10))
+
+        async def get_all():
+            return await asyncio.gather(*[
+                service.get('/%d' % i) for i in range(6)])
+        self.assertEqual(self.run_async(get_all()), [self.response] * 6)
+        self.assertEqual(max(most_running), 2)
+
+    def test_hedges_slow_requests(self):
+        cancelled = []
+
+        async def transport(**kwargs):
+            self.requests.append(kwargs)
+            if len(self.requests) == 1:
+                try:
+                    await asyncio.sleep(1)
+                except asyncio.CancelledError:
+                    cancelled.append(kwargs)
+                    raise
+            return self.response
+        self.service.transport = transport
+
+        response = self.run_async(self.service.get(
+            '/path', hedge_policy=HedgePolicy(delay=0.01)))
+        self.assertEqual(response, self.response)
+        self.assertEqual(len(self.requests), 2)
+        self.run_async(asyncio.sleep(0))
+        self.assertEqual(len(cancelled), 1)
+
+    def test_deadline_bounds_request_timeouts(self):
+        async def get_with_deadline():
+            with deadline(5):
+                await asyncio.ensure_future(self.service.get('/path'))
+            with deadline(0):
+                await self.service.get('/path')
+        with self.assertRaises(DeadlineExceeded):
+            self.run_async(get_with_deadline())
+        self.assertEqual(len(self.requests), 1)
+        self.assertLessEqual(self.requests[0]['timeout'], 5)
+
+    def test_coalesces_identical_requests(self):
+        async def transport(**kwargs):
+            self.requests.append(kwargs)
+            await asyncio.sleep(0.01)
+            return self.response
+        self.service.transport = transport
+
+        async def get_all():
+            return await asyncio.gather(*[
+                self.service.get('/path', coalesce=True) for _ in range(5)])
+        responses = self.run_async(get_all())
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(len(set(map(id, responses))), 5)
+        self.assertIn(self.response, responses)
+
+    def test_does_not_coalesce_streamed_requests(self):
+        async def transport(**kwargs):
+            self.requests.append(kwargs)
+            await asyncio.sleep(0.01)
+            return self.response
+        self.service.transport = transport
+
+        async def get_all():
+            return await asyncio.gather(*[
+                self.service.get('/path', coalesce=True, stream=True)
+                for _ in range(2)])
+        self.run_async(get_all())
+        self.assertEqual(len(self.requests), 2)
+
+    def test_coalesced_requests_demand_their_own_response_codes(self):
+        self.response.status_code = 404
+
+        async def transport(**kwargs):
+            self.requests.append(kwargs)
+            await asyncio.sleep(0.01)
+            return self.response
+        self.service.transport = transport
+
+        async def get_both():
+            return await asyncio.gather(
+                self.service.get('/path', coalesce=True),
+                self.service.get(
+                    '/path', coalesce=True, expected_response_codes=[404]),
+                return_exceptions=True)
+        default, expected = self.run_async(get_both())
+        self.assertIsInstance(default, HTTPServiceError)
+        self.assertEqual(expected.status_code, 404)
+        self.assertEqual(len(self.requests), 1)
+
+    def test_map_returns_results(self):
+        async def transport(**kwargs):
+            if kwargs['url'].endswith('/broken'):
+                return Mock(spec=Response(), status_code=500, content='',
+                            url=kwargs['url'])
+            return self.response
+        self.service.transport = transport
+
+        async def map_all(**kwargs):
+            return [result async for result in self.service.map(
+                'GET', ['/a', '/broken', ('/b', {'params': {'c': 'd'}})],
+                concurrency=2, **kwargs)]
+        results = self.run_async(map_all())
+        self.assertEqual(
+            [request for request, _ in results],
+            ['/a', '/broken', ('/b', {'params': {'c': 'd'}})])
+        self.assertEqual(results[0][1], self.response)
+        self.assertIsInstance(results[1][1], HTTPServiceError)
+
+        results = self.run_async(map_all(ordered=False))
+        self.assertEqual(len(results), 3)
+
+    def test_map_sends_requests_as_results_are_consumed(self):
+        async def map_one(ordered):
+            results = self.service.map(
+                'GET', ('/%d' % i for i in range(1000)), concurrency=4,
+                ordered=ordered)
+            await results.__anext__()
+            await asyncio.sleep(0.01)
+            await results.aclose()
+
+        for ordered in (True, False):
+            del self.requests[:]
+            self.run_async(map_one(ordered))
+            self.assertLessEqual(len(self.requests), 5)
+
+    def test_closes_transport(self):
+        self.service.transport = Mock(close=Mock(
+            return_value=asyncio.sleep(0)))
+        self.run_async(self.service.close())
+        self.service.transport.close.assert_called_once_with()
+
+
+@skipIf(aiohttp is None, 'requires aiohttp')
+class AiohttpTransportTest(AsyncTestCase):
+    def setUp(self):
+        super(AiohttpTransportTest, self).setUp()
+        app = aiohttp.web.Application()
+        app.router.add_route('*', '/{path}', self.handle)
+        self.server = aiohttp.test_utils.TestServer(app)
+        self.run_async(self.server.start_server())
+        self.service = AsyncHTTPServiceClient(
+            str(self.server.make_url('/')))
+
+    def tearDown(self):
+        self.run_async(self.service.close())
+        self.run_async(self.server.close())
+        super(AiohttpTransportTest, self).tearDown()
+
+    async def handle(self, request):
+        if request.path == '/slow':
+            await asyncio.sleep(1)
+        return aiohttp.web.json_response({
+            'path': request.path, 'body': await request.text(),
+            'cookie': request.cookies.get('session')})
+
+    def test_returns_requests_responses(self):
+        response = self.run_async(self.service.post(
+            '/path', data='body', params={'page': 2},
+            cookies={'session': 'abc'}))
+        self.assertTrue(response.is_ok)
+        self.assertEqual(
+            response.url, str(self.server.make_url('/path?page=2')))
+        self.assertEqual(response.json(), {
+            'path': '/path', 'body': 'body', 'cookie': 'abc'})
+        self.assertEqual(
+            response.headers['content-type'],
+            'application/json; charset=utf-8')
+        self.assertIsInstance(response.elapsed, timedelta)
+
+    def test_raises_requests_exceptions(self):
+        with self.assertRaises(ReadTimeout):
+            self.run_async(self.service.get('/slow', timeout=0.05))
+        self.run_async(self.server.close())
+        with self.assertRaises(ConnectionError):
+            self.run_async(self.service.get('/path'))
+
+    def test_map_returns_errors_as_results(self):
+        async def map_all():
+            return [result async for result in self.service.map(
+                'GET', [('/slow', {'timeout': 0.05})])]
+        (_, error), = self.run_async(map_all())
+        self.assertIsInstance(error, ReadTimeout)
+
+
+@skipIf(httpx is None, 'requires httpx')
+class HttpxTransportTest(AsyncTestCase):
+    def setUp(self):
+        super(HttpxTransportTest, self).setUp()
+        self.requests = []
+        self.service = AsyncHTTPServiceClient(
+            'http://service.com/', transport=HttpxTransport(
+                transport=httpx.MockTransport(self.handle)))
+
+    def tearDown(self):
+        self.run_async(self.service.close())
+        super(HttpxTransportTest, self).tearDown()
+
+    def handle(self, request):
+        self.requests.append(request)
+        if request.url.path == '/timeout':
+            raise httpx.ReadTimeout('timed out', request=request)
+        return httpx.Response(200, json={'path': request.url.path})
+
+    def test_returns_requests_responses(self):
+        response = self.run_async(self.service.post(
+            '/path', data='body', params={'page': 2},
+            cookies={'session': 'abc'}))
+        self.assertTrue(response.is_ok)
+        self.assertEqual(response.url, 'http://service.com/path?page=2')
+        self.assertEqual(response.json(), {'path': '/path'})
+        self.assertEqual(response.http_version, 'HTTP/1.1')
+        self.assertEqual(self.requests[0].content, b'body')
+        self.assertEqual(self.requests[0].headers['Cookie'], 'session=abc')
+
+    def test_raises_requests_exceptions(self):
+        with self.assertRaises(ReadTimeout):
+            self.run_async(self.service.get('/timeout', timeout=1))
+
+    def test_rejects_unsupported_params(self):
+        with self.assertRaises(ValueError):
+            self.run_async(self.service.get('/path', verify=False))
+
+
+class AsyncPaginationTest(AsyncTestCase):
+    def setUp(self):
+        super(AsyncPaginationTest, self).setUp()
+        self.requested = []
+
+    async def get(self, offset, limit):
+        self.requested.append(offset)
+        await asyncio.sleep(0)
+        return {
+            'results': list(range(offset, min(offset + limit, 45))),
+            'next': 'next_url' if offset + limit < 45 else None,
+        }
+
+    async def get_counted(self, offset, limit):
+        page = await self.get(offset, limit)
+        page['count'] = 45
+        return page
+
+    def collect(self, fn, **options):
+        async def collect():
+            options.setdefault('pagination_type', PaginationType.ITEM)
+            results = AsyncPaginatedResults(
+                fn, page_size=10, page_param='offset',
+                page_size_param='limit', **options)
+            return [item async for item in results]
+        return self.run_async(collect())
+
+    def test_iterates_pages(self):
+        self.assertEqual(self.collect(self.get), list(range(45)))
+        self.assertEqual(self.requested, [0, 10, 20, 30, 40])
+
+    def test_iterates_cursor_pages(self):
+        async def get(limit, offset=None):
+            page = await self.get(int(offset or 0), limit)
+            if page['next']:
+                page['next'] = page['results'][-1] + 1
+            return page
+        self.assertEqual(
+            self.collect(get, pagination_type=PaginationType.CURSOR),
+            list(range(45)))
+
+    def test_resumes_from_position(self):
+        positions = []
+        self.assertEqual(
+            self.collect(self.get, resume={'page': 30, 'offset': 5},
+                         checkpoint=positions.append),
+            list(range(35, 45)))
+        self.assertEqual(positions, [
+            {'page': 40, 'offset': 0}, {'page': 40, 'offset': 5}])
+
+    def test_iterates_pages_and_batches(self):
+        async def collect():
+            results = AsyncPaginatedResults(
+                self.get, page_size=10, page_param='offset',
+                page_size_param='limit', pagination_type=PaginationType.ITEM)
+            pages = [page async for page in results.iter_pages()]
+            batches = [batch async for batch in results.iter_batches(20)]
+            return pages, batches
+        pages, batches = self.run_async(collect())
+        self.assertEqual(
+            [page.page_id for page in pages], [0, 10, 20, 30, 40])
+        self.assertEqual(batches, [
+            list(range(0, 20)), list(range(20, 40)), list(range(40, 45))])
+
+    def test_iterates_prefetched_pages_in_order(self):
+        self.assertEqual(self.collect(self.get, prefetch=3), list(range(45)))
+
+    def test_iterates_counted_pages(self):
+        self.assertEqual(
+            self.collect(self.get_counted, prefetch=3), list(range(45)))
+        self.assertEqual(sorted(self.requested), [0, 10, 20, 30, 40])
+
+    def test_iterates_unordered_counted_pages(self):
+        self.assertEqual(
+            sorted(self.collect(self.get_counted, prefetch=3, ordered=False)),
+            list(range(45)))
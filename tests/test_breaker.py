@@ -0,0 +1,87 @@
+from unittest import TestCase
+
+from mock import Mock, patch
+
+from demands import HTTPServiceError
+from demands.breaker import CircuitBreaker, CircuitOpenError, host_key
+
+
+def make_response(status_code=200):
+    return Mock(status_code=status_code)
+
+
+class CircuitBreakerTest(TestCase):
+    def setUp(self):
+        self.monotonic_patcher = patch('demands.breaker.monotonic')
+        self.monotonic = self.monotonic_patcher.start()
+        self.monotonic.return_value = 0
+        self.breaker = CircuitBreaker(failures=3, window=10, reset_timeout=5)
+
+    def tearDown(self):
+        self.monotonic_patcher.stop()
+
+    def fail(self, times=1, url='http://service.com/path'):
+        for _ in range(times):
+            key = self.breaker.acquire(url)
+            self.breaker.release(key, make_response(503))
+
+    def test_opens_after_failures_in_window(self):
+        self.fail(2)
+        self.assertFalse(self.breaker.is_open('http://service.com/'))
+        self.breaker.release(self.breaker.acquire('http://service.com/'),
+                             error=IOError())
+        self.assertTrue(self.breaker.is_open('http://service.com/'))
+        with self.assertRaises(CircuitOpenError) as e:
+            self.breaker.acquire('http://service.com/')
+        self.assertEqual(e.exception.retry_after, 5)
+        self.assertIn('retry after 5.00s', str(e.exception))
+        self.assertIsInstance(e.exception, HTTPServiceError)
+
+    def test_failures_outside_window_are_forgotten(self):
+        self.fail(2)
+        self.monotonic.return_value = 11
+        self.fail(2)
+        self.assertFalse(self.breaker.is_open('http://service.com/'))
+
+    def test_successful_responses_are_not_failures(self):
+        for status_code in (200, 404):
+            self.breaker.release(
+                self.breaker.acquire('http://service.com/'),
+                make_response(status_code))
+        self.fail(2)
+        self.assertFalse(self.breaker.is_open('http://service.com/'))
+
+    def test_successful_probe_closes_circuit(self):
+        self.fail(3)
+        self.monotonic.return_value = 5
+        key = self.breaker.acquire('http://service.com/')
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.acquire('http://service.com/')
+        self.breaker.release(key, make_response(200))
+        self.assertFalse(self.breaker.is_open('http://service.com/'))
+        self.breaker.acquire('http://service.com/')
+
+    def test_failed_probe_opens_circuit_again(self):
+        self.fail(3)
+        self.monotonic.return_value = 5
+        self.fail()
+        self.monotonic.return_value = 9
+        with self.assertRaises(CircuitOpenError) as e:
+            self.breaker.acquire('http://service.com/')
+        self.assertEqual(e.exception.retry_after, 1)
+
+    def test_unfinished_probe_expires(self):
+        self.fail(3)
+        self.monotonic.return_value = 5
+        self.breaker.acquire('http://service.com/')
+        self.monotonic.return_value = 10
+        self.breaker.acquire('http://service.com/')
+
+    def test_keeps_circuits_by_key(self):
+        self.breaker.key = host_key
+        self.fail(3, url='http://broken.com/path')
+        self.assertTrue(self.breaker.is_open('http://broken.com/other'))
+        self.assertFalse(self.breaker.is_open('http://service.com/path'))
+        self.assertEqual(
+            self.breaker.acquire('http://service.com/'),
+            'http://service.com')
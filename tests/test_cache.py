@@ -0,0 +1,165 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+
+from requests import Request, Response
+from requests.auth import AuthBase, HTTPBasicAuth
+from requests.cookies import RequestsCookieJar
+
+from demands.cache import CacheEntry, DiskStore, MemoryStore, ResponseCache
+
+
+def make_response(status_code=200, headers=None, content=b'{"id": 1}'):
+    response = Response()
+    response.status_code = status_code
+    response.url = 'http://service.com/path'
+    response.headers.update(headers or {})
+    response._content = content
+    return response
+
+
+def make_params(method='GET', **kwargs):
+    return dict(kwargs, method=method, url='http://service.com/path')
+
+
+class MemoryStoreTest(TestCase):
+    def test_evicts_least_recently_used_entries(self):
+        store = MemoryStore(max_entries=2)
+        store.set('a', 1)
+        store.set('b', 2)
+        store.get('a')
+        store.set('c', 3)
+        self.assertEqual(
+            [store.get('a'), store.get('b'), store.get('c')], [1, None, 3])
+
+    def test_deletes_entries(self):
+        store = MemoryStore()
+        store.set('a', 1)
+        store.delete('a')
+        self.assertIsNone(store.get('a'))
+
+
+class DiskStoreTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = DiskStore(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_stores_entries(self):
+        self.store.set('key', CacheEntry(make_response(), 123))
+        entry = DiskStore(self.directory).get('key')
+        self.assertEqual(entry.expires, 123)
+        self.assertEqual(entry.response.json(), {'id': 1})
+
+    def test_does_not_store_requests(self):
+        response = make_response(headers={'ETag': '"abc"'})
+        response.request = Request(
+            'GET', response.url,
+            headers={'Authorization': 'Bearer secret'}).prepare()
+        self.store.set('key', CacheEntry(response, 123))
+
+        with open(os.path.join(self.directory, 'key'), 'rb') as entry_file:
+            self.assertNotIn(b'secret', entry_file.read())
+        entry = self.store.get('key')
+        self.assertIsNone(entry.response.request)
+        self.assertEqual(entry.response.headers['etag'], '"abc"')
+
+    def test_ignores_unreadable_entries(self):
+        with open(os.path.join(self.directory, 'key'), 'wb') as entry_file:
+            entry_file.write(b'not json')
+        self.assertIsNone(self.store.get('key'))
+
+    def test_deletes_entries(self):
+        self.store.set('key', CacheEntry(make_response(), 123))
+        self.store.delete('key')
+        self.assertIsNone(self.store.get('key'))
+
+
+class ResponseCacheTest(TestCase):
+    def setUp(self):
+        self.cache = ResponseCache(ttl=60)
+
+    def test_only_caches_get_requests(self):
+        self.assertIsNone(self.cache.get_key(make_params('POST')))
+
+    def test_key_depends_on_params_and_vary_headers(self):
+        key = self.cache.get_key(make_params(params={'a': 1}))
+        self.assertEqual(key, self.cache.get_key(make_params(
+            params={'a': 1}, headers={'X-Request-Id': '1'})))
+        self.assertNotEqual(key, self.cache.get_key(make_params(
+            params={'a': 2})))
+        self.assertNotEqual(key, self.cache.get_key(make_params(
+            params={'a': 1}, headers={'accept': 'text/html'})))
+
+    def test_key_depends_on_credentials(self):
+        key = self.cache.get_key(make_params(cookies={'session': 'alice'}))
+        for params in (
+                make_params(cookies={'session': 'bob'}),
+                make_params(headers={'Cookie': 'session=alice'}),
+                make_params(headers={'Authorization': 'Bearer token'}),
+                make_params(auth=('alice', 'password'))):
+            self.assertNotEqual(key, self.cache.get_key(params))
+
+        jar = RequestsCookieJar()
+        jar.set('session', 'bob')
+        self.assertNotEqual(
+            key, self.cache.get_key(make_params(), session_cookies=jar))
+
+    def test_key_is_the_same_for_equal_auth(self):
+        self.assertEqual(
+            self.cache.get_key(make_params(
+                auth=HTTPBasicAuth('alice', 'password'))),
+            self.cache.get_key(make_params(
+                auth=HTTPBasicAuth('alice', 'password'))))
+        self.assertNotEqual(
+            self.cache.get_key(make_params(
+                auth=HTTPBasicAuth('alice', 'password'))),
+            self.cache.get_key(make_params(
+                auth=HTTPBasicAuth('bob', 'password'))))
+
+    def test_does_not_cache_requests_with_unknown_auth(self):
+        self.assertIsNone(self.cache.get_key(make_params(auth=AuthBase())))
+
+    def test_caches_successful_responses(self):
+        response = make_response()
+        self.assertIs(self.cache.update('key', response), response)
+        entry = self.cache.get('key')
+        self.assertTrue(entry.is_fresh)
+        self.assertTrue(entry.get_response().from_cache)
+        self.assertEqual(entry.get_response().json(), {'id': 1})
+
+    def test_does_not_cache_errors(self):
+        self.cache.update('key', make_response(500))
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_respects_cache_control(self):
+        self.cache.update('key', make_response(headers={
+            'Cache-Control': 'no-store'}))
+        self.assertIsNone(self.cache.get('key'))
+
+        self.cache.update('key', make_response(headers={
+            'Cache-Control': 'public, max-age=0'}))
+        self.assertFalse(self.cache.get('key').is_fresh)
+
+    def test_revalidates_with_validators(self):
+        self.cache.ttl = 0
+        last_modified = 'Wed, 21 Oct 2015 07:28:00 GMT'
+        self.cache.update('key', make_response(headers={
+            'ETag': '"abc"', 'Last-Modified': last_modified}))
+        entry = self.cache.get('key')
+        self.assertEqual(entry.validators, {
+            'If-None-Match': '"abc"', 'If-Modified-Since': last_modified})
+
+    def test_serves_not_modified_responses_from_cache(self):
+        self.cache.update('key', make_response(headers={'ETag': '"abc"'}))
+        entry = self.cache.get('key')
+        entry.expires = time.time() - 1
+
+        response = self.cache.update('key', make_response(304), entry)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.from_cache)
+        self.assertTrue(self.cache.get('key').is_fresh)
@@ -0,0 +1,64 @@
+import threading
+import time
+from unittest import TestCase
+
+from demands.coalesce import SingleFlight
+
+
+class SingleFlightTest(TestCase):
+    threads = 10
+
+    def setUp(self):
+        self.single_flight = SingleFlight()
+        self.release = threading.Event()
+        self.calls = []
+        self.results = []
+        self.errors = []
+
+    def fn(self, value):
+        self.calls.append(value)
+        self.release.wait()
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    def do(self, key, value):
+        try:
+            self.results.append(self.single_flight.do(key, self.fn, value))
+        except Exception as e:
+            self.errors.append(e)
+
+    def run_threads(self, key, value):
+        threads = [threading.Thread(target=self.do, args=(key, value))
+                   for _ in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        while not self.calls:
+            time.sleep(0.001)
+        time.sleep(0.05)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+
+    def test_concurrent_calls_share_result(self):
+        self.run_threads('key', 'value')
+        self.assertEqual(self.calls, ['value'])
+        self.assertEqual(self.results, ['value'] * self.threads)
+
+    def test_concurrent_calls_share_exception(self):
+        error = ValueError()
+        self.run_threads('key', error)
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(self.errors, [error] * self.threads)
+
+    def test_calls_with_different_keys_are_not_shared(self):
+        self.release.set()
+        self.do('a', 1)
+        self.do('b', 2)
+        self.assertEqual(self.calls, [1, 2])
+
+    def test_sequential_calls_are_not_shared(self):
+        self.release.set()
+        self.do('a', 1)
+        self.do('a', 1)
+        self.assertEqual(self.calls, [1, 1])
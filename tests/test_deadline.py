@@ -0,0 +1,54 @@
+import threading
+from unittest import TestCase
+
+from mock import patch
+
+from demands.deadline import (
+    DeadlineExceeded, bind, check_deadline, deadline, get_deadline,
+    get_remaining)
+
+
+@patch('demands.deadline.monotonic')
+class DeadlineTest(TestCase):
+    def test_no_deadline(self, monotonic):
+        self.assertIsNone(get_deadline())
+        self.assertIsNone(get_remaining())
+        self.assertIsNone(check_deadline())
+
+    def test_sets_deadline_in_block(self, monotonic):
+        monotonic.return_value = 10
+        with deadline(5):
+            self.assertEqual(get_deadline(), 15)
+            monotonic.return_value = 12
+            self.assertEqual(get_remaining(), 3)
+        self.assertIsNone(get_deadline())
+
+    def test_nested_deadlines_are_not_later(self, monotonic):
+        monotonic.return_value = 0
+        with deadline(5):
+            with deadline(10):
+                self.assertEqual(get_deadline(), 5)
+            with deadline(2):
+                self.assertEqual(get_deadline(), 2)
+            self.assertEqual(get_deadline(), 5)
+
+    def test_raises_once_deadline_has_passed(self, monotonic):
+        monotonic.return_value = 0
+        with deadline(5):
+            monotonic.return_value = 5
+            with self.assertRaises(DeadlineExceeded):
+                check_deadline()
+
+    def test_deadlines_are_not_shared_by_threads(self, monotonic):
+        monotonic.return_value = 0
+        deadlines = []
+        with deadline(5):
+            thread = threading.Thread(
+                target=lambda: deadlines.append(get_deadline()))
+            thread.start()
+            thread.join()
+            thread = threading.Thread(
+                target=bind(lambda: deadlines.append(get_deadline())))
+            thread.start()
+            thread.join()
+        self.assertEqual(deadlines, [None, 5])
@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
 import inspect
 import json
+import pickle
+import threading
+import time
+from datetime import timedelta
 from unittest import TestCase
 
 from requests import Session, Response
@@ -8,6 +12,12 @@ from mock import Mock, patch
 from six import itervalues
 
 from demands import HTTPServiceClient, HTTPServiceError
+from demands.breaker import CircuitBreaker, CircuitOpenError
+from demands.cache import ResponseCache
+from demands.deadline import DeadlineExceeded, deadline
+from demands.hedge import HedgePolicy
+from demands.retry import RetryPolicy
+from demands.throttle import RateLimiter
 
 
 class PatchedSessionTests(TestCase):
@@ -94,6 +104,22 @@ class HttpServiceTests(PatchedSessionTests):
             headers={'thomas': 'homegirl', 'name': 'value'},
             method='GET', url='http://localhost/', allow_redirects=True)
 
+    def test_shared_params_are_not_modified_by_requests(self):
+        service = HTTPServiceClient(
+            url='http://localhost/', headers={'name': 'value'})
+
+        def pre_send(request_params):
+            request_params['headers']['pre'] = 'send'
+            return request_params
+        service.pre_send = pre_send
+
+        service.get('/', headers={'thomas': 'homegirl'})
+        self.request.assert_called_with(
+            headers={'thomas': 'homegirl', 'name': 'value', 'pre': 'send'},
+            method='GET', url='http://localhost/', allow_redirects=True)
+        self.assertEqual(
+            service._shared_request_params, {'headers': {'name': 'value'}})
+
     def test_sets_authentication_when_provided(self):
         service = HTTPServiceClient(
             url='http://localhost/',
@@ -113,6 +139,16 @@ class HttpServiceTests(PatchedSessionTests):
         service.get('/authed-endpoint')
         debug_msgs = get_parsed_log_messages(mock_log, 'debug')
         self.assertIn('Authentication', debug_msgs[2])
+        self.assertNotIn('bar', debug_msgs[1])
+
+    @patch('demands.monotonic')
+    @patch('demands.log')
+    def test_does_not_log_or_time_when_debug_is_disabled(
+            self, mock_log, monotonic):
+        mock_log.isEnabledFor.return_value = False
+        self.service.get('/path')
+        self.assertFalse(mock_log.debug.called)
+        self.assertFalse(monotonic.called)
 
     def test_client_identification_adds_user_agent_header(self):
         """client identification adds User-Agent header"""
@@ -145,6 +181,62 @@ class HttpServiceTests(PatchedSessionTests):
                 'http://broken/, code: 500, details: '
             ))
 
+    def test_error_details_and_message_are_parsed_lazily_once(self):
+        self.response.configure_mock(
+            status_code=404, url='http://notfound/')
+        self.response.json.return_value = {'error': 'not found'}
+        error = HTTPServiceError(self.response)
+        self.assertFalse(self.response.json.called)
+
+        self.assertEqual(error.details, {'error': 'not found'})
+        self.assertEqual(
+            str(error), 'Unexpected response: url: http://notfound/, '
+            "code: 404, details: {'error': 'not found'}")
+        self.assertEqual(error.args, (str(error),))
+        self.assertEqual(self.response.json.call_count, 1)
+
+    def test_error_repr_includes_message(self):
+        self.response.configure_mock(
+            status_code=500, url='http://broken/', content='content')
+        self.response.json.side_effect = ValueError
+        error = HTTPServiceError(self.response)
+        self.assertEqual(repr(error), 'HTTPServiceError(%r)' % str(error))
+
+    def test_error_args_can_be_set(self):
+        self.response.configure_mock(
+            status_code=500, url='http://broken/', content='content')
+        self.response.json.side_effect = ValueError
+        error = HTTPServiceError(self.response)
+        error.args = ('Loading user 1: %s' % error,)
+        self.assertEqual(str(error), error.args[0])
+        self.assertTrue(str(error).startswith(
+            'Loading user 1: Unexpected response: url: http://broken/'))
+        self.assertEqual(repr(error), 'HTTPServiceError(%r)' % str(error))
+
+    def test_error_can_be_pickled(self):
+        response = Response()
+        response.status_code = 500
+        response.url = 'http://broken/'
+        response._content = b'content'
+        error = pickle.loads(pickle.dumps(HTTPServiceError(response)))
+        self.assertEqual(error.response.status_code, 500)
+        self.assertEqual(error.args, (str(error),))
+        self.assertTrue(str(error).startswith(
+            'Unexpected response: url: http://broken/, code: 500'))
+
+    def test_error_message_truncates_details(self):
+        self.response.configure_mock(
+            status_code=500, url='http://broken/', content='x' * 1500)
+        self.response.json.side_effect = ValueError
+        error = HTTPServiceError(self.response)
+        self.assertTrue(str(error).endswith(
+            'details: %s... (500 characters truncated)' % ('x' * 1000)))
+        self.assertEqual(error.details, 'x' * 1500)
+
+        error = HTTPServiceError(self.response)
+        error.max_details_length = None
+        self.assertTrue(str(error).endswith('x' * 1500))
+
     def test_post_sends_no_exception_in_case_of_expected_response_code(self):
         self.response.configure_mock(
             status_code=404, content='content', url='http://notfound/')
@@ -188,16 +280,589 @@ class HttpServiceTests(PatchedSessionTests):
             allow_redirects=True
         )
 
-    def test_pre_send_sets_max_retries(self):
-        self.service.pre_send({'max_retries': 2})
-        for adapter in itervalues(self.service.adapters):
+    def test_absolute_urls_are_used_as_they_are(self):
+        self.service.get('https://other.com/get-endpoint?page=2')
+        self.request.assert_called_with(
+            method='GET', url='https://other.com/get-endpoint?page=2',
+            allow_redirects=True
+        )
+
+    def test_shared_credentials_are_not_sent_to_other_hosts(self):
+        service = HTTPServiceClient(
+            'http://service.com/', auth=('user', 'password'),
+            cookies={'session': 'abc'},
+            headers={'Authorization': 'Bearer token', 'X-Name': 'value'})
+        for url in ('http://other.com/get-endpoint',
+                    'https://service.com/get-endpoint',
+                    'http://service.com:8080/get-endpoint'):
+            service.get(url)
+            self.request.assert_called_with(
+                method='GET', url=url, allow_redirects=True,
+                headers={'X-Name': 'value'})
+
+        service.get('http://SERVICE.com/get-endpoint')
+        self.request.assert_called_with(
+            method='GET', url='http://SERVICE.com/get-endpoint',
+            allow_redirects=True, auth=('user', 'password'),
+            cookies={'session': 'abc'},
+            headers={'Authorization': 'Bearer token', 'X-Name': 'value'})
+
+    def test_credentials_of_the_request_are_sent_to_other_hosts(self):
+        service = HTTPServiceClient(
+            'http://service.com/', auth=('user', 'password'))
+        service.get('http://other.com/get-endpoint', auth=('other', 'pass'))
+        self.request.assert_called_with(
+            method='GET', url='http://other.com/get-endpoint',
+            allow_redirects=True, auth=('other', 'pass'))
+
+    def test_url_is_composed_properly_if_url_is_changed(self):
+        self.service.url = 'http://other.com/some/path'
+        self.service.get('/get-endpoint')
+        self.request.assert_called_with(
+            method='GET', url='http://other.com/some/path/get-endpoint',
+            allow_redirects=True
+        )
+
+    def test_shared_verify_ssl_parameter_is_translated(self):
+        service = HTTPServiceClient('http://service.com/', verify_ssl=False)
+        service.get('/get-endpoint')
+        self.request.assert_called_with(
+            method='GET', url='http://service.com/get-endpoint',
+            allow_redirects=True, verify=False
+        )
+
+    def test_requests_use_adapters_with_max_retries(self):
+        def request(**kwargs):
+            adapter = self.service.get_adapter(kwargs['url'])
             self.assertEqual(adapter.max_retries, 2)
+            return self.response
+        self.request.side_effect = request
+        self.service.get('/path', max_retries=2)
 
-    def test_pre_send_defaults_max_retries_to_zero(self):
-        self.service.pre_send({'max_retries': 2})
-        self.service.pre_send({})
-        for adapter in itervalues(self.service.adapters):
+    def test_max_retries_defaults_to_zero(self):
+        def request(**kwargs):
+            adapter = self.service.get_adapter(kwargs['url'])
             self.assertEqual(adapter.max_retries, 0)
+            return self.response
+        self.request.side_effect = request
+        self.service.get('/path')
+
+    def test_max_retries_do_not_modify_mounted_adapters(self):
+        self.service.get('/path', max_retries=2)
+        for adapter in itervalues(self.service.adapters):
+            self.assertNotEqual(adapter.max_retries, 2)
+
+    def test_adapters_with_max_retries_share_connection_pools(self):
+        mounted = self.service.adapters['http://']
+        self.service._local.max_retries = 2
+        adapter = self.service.get_adapter('http://service.com/')
+        self.assertIsNot(adapter, mounted)
+        self.assertIs(adapter.poolmanager, mounted.poolmanager)
+        self.assertIs(self.service.get_adapter('http://service.com/'), adapter)
+
+    @patch('demands.time.sleep')
+    def test_retries_responses_with_retry_policy(self, sleep):
+        failed = Mock(spec=Response(), status_code=503, headers={})
+        self.request.side_effect = [failed, failed, self.response]
+        service = HTTPServiceClient(
+            'http://service.com/',
+            retry_policy=RetryPolicy(backoff_factor=1, jitter=False))
+
+        self.assertEqual(service.get('/path'), self.response)
+        self.assertEqual(self.request.call_count, 3)
+        self.assertEqual(
+            [call_args[0] for call_args in sleep.call_args_list],
+            [(1,), (2,)])
+        failed.close.assert_called_with()
+
+    @patch('demands.time.sleep')
+    def test_raises_error_when_retries_are_exhausted(self, sleep):
+        self.response.configure_mock(
+            status_code=503, headers={}, url='http://service.com/path')
+        with self.assertRaises(HTTPServiceError):
+            self.service.get('/path', retry_policy=RetryPolicy(retries=2))
+        self.assertEqual(self.request.call_count, 3)
+
+    def test_serves_cached_responses(self):
+        response = Response()
+        response.status_code = 200
+        response._content = b'{}'
+        self.request.return_value = response
+        service = HTTPServiceClient(
+            'http://service.com/', cache=ResponseCache())
+        service.post_send = lambda response, **kwargs: (
+            response, response.is_ok)
+
+        fresh, is_ok = service.get('/path')
+        cached, cached_is_ok = service.get('/path')
+        self.assertEqual(self.request.call_count, 1)
+        self.assertTrue(cached.from_cache)
+        self.assertTrue(cached_is_ok)
+        self.assertEqual(cached.json(), {})
+
+    def test_revalidates_stale_cached_responses(self):
+        response = Response()
+        response.status_code = 200
+        response.headers['ETag'] = '"abc"'
+        response._content = b'{}'
+        not_modified = Mock(spec=Response(), status_code=304, headers={})
+        self.request.side_effect = [response, not_modified]
+        service = HTTPServiceClient(
+            'http://service.com/', cache=ResponseCache(ttl=0))
+
+        service.get('/path')
+        cached = service.get('/path')
+        self.request.assert_called_with(
+            method='GET', url='http://service.com/path', allow_redirects=True,
+            headers={'If-None-Match': '"abc"'})
+        self.assertEqual(cached.status_code, 200)
+        self.assertTrue(cached.from_cache)
+
+    def test_reports_requests_to_metrics(self):
+        response = Response()
+        response.status_code = 200
+        response.elapsed = timedelta(seconds=0.01)
+        response._content = b'{"id": 1}'
+        response.request = Mock(body='{"name": "user"}')
+        self.request.return_value = response
+        events = []
+        service = HTTPServiceClient(
+            'http://service.com/api/', metrics=events.append)
+
+        service.post('/users/1/', data='{"name": "user"}')
+        service.get('/users/', path_template='/all-users/')
+        self.assertEqual(len(events), 2)
+        event = events[0]
+        self.assertEqual(event.method, 'POST')
+        self.assertEqual(event.path_template, '/api/users/{id}/')
+        self.assertEqual(event.url, 'http://service.com/api/users/1/')
+        self.assertEqual(event.status_code, 200)
+        self.assertEqual(event.ttfb, 0.01)
+        self.assertGreaterEqual(event.download, 0)
+        self.assertGreaterEqual(event.duration, 0)
+        self.assertEqual(event.bytes_sent, 16)
+        self.assertEqual(event.bytes_received, 9)
+        self.assertEqual(event.retries, 0)
+        self.assertFalse(event.from_cache)
+        self.assertEqual(events[1].path_template, '/all-users/')
+
+    @patch('demands.time.sleep')
+    def test_reports_retries_and_cache_hits_to_metrics(self, sleep):
+        response = Response()
+        response.status_code = 200
+        response._content = b'{}'
+        failed = Response()
+        failed.status_code = 503
+        failed._content = b''
+        failed._content_consumed = True
+        self.request.side_effect = [failed, response]
+        events = []
+        service = HTTPServiceClient(
+            'http://service.com/', metrics=events.append,
+            retry_policy=RetryPolicy(), cache=ResponseCache())
+
+        service.get('/path')
+        service.get('/path')
+        self.assertEqual(
+            [(event.status_code, event.retries, event.from_cache)
+             for event in events],
+            [(200, 1, False), (200, 0, True)])
+
+    def test_reports_connection_errors_to_metrics(self):
+        self.request.side_effect = IOError
+        events = []
+        with self.assertRaises(IOError):
+            self.service.get('/path', metrics=events.append)
+        self.assertIsNone(events[0].status_code)
+        self.assertIsInstance(events[0].error, IOError)
+
+    def test_fails_fast_while_circuit_is_open(self):
+        self.request.side_effect = IOError
+        service = HTTPServiceClient(
+            'http://service.com/',
+            circuit_breaker=CircuitBreaker(failures=2))
+        for _ in range(2):
+            with self.assertRaises(IOError):
+                service.get('/path')
+        with self.assertRaises(CircuitOpenError):
+            service.get('/path')
+        self.assertEqual(self.request.call_count, 2)
+
+    @patch('demands.time.sleep')
+    def test_rate_limiter_is_acquired_for_each_attempt(self, sleep):
+        self.response.configure_mock(status_code=503, headers={})
+        rate_limiter = Mock()
+        with self.assertRaises(HTTPServiceError):
+            self.service.get(
+                '/path', rate_limiter=rate_limiter,
+                retry_policy=RetryPolicy(retries=2))
+        self.assertEqual(rate_limiter.acquire.call_count, 3)
+
+    def test_max_in_flight_bounds_concurrent_requests(self):
+        service = HTTPServiceClient('http://service.com/', max_in_flight=2)
+        lock = threading.Lock()
+        running = [0]
+        most_running = [0]
+
+        def request(**kwargs):
+            with lock:
+                running[0] += 1
+                most_running[0] = max(most_running[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+            return self.response
+        self.request.side_effect = request
+
+        results = list(service.map(
+            'GET', ['/%d' % i for i in range(8)], concurrency=8))
+        self.assertEqual(len(results), 8)
+        self.assertEqual(most_running[0], 2)
+
+    def test_requests_waiting_for_rate_limiter_do_not_hold_in_flight(self):
+        service = HTTPServiceClient('http://service.com/', max_in_flight=1)
+        waiting = threading.Event()
+        release = threading.Event()
+        rate_limiter = Mock()
+        rate_limiter.acquire.side_effect = lambda timeout: (
+            waiting.set() or release.wait(1))
+        throttled = threading.Thread(target=lambda: service.get(
+            '/throttled', rate_limiter=rate_limiter))
+        throttled.start()
+        waiting.wait(1)
+
+        other = threading.Thread(target=lambda: service.get('/other'))
+        other.start()
+        other.join(0.5)
+        finished = not other.is_alive()
+        release.set()
+        throttled.join()
+        other.join()
+        self.assertTrue(finished)
+
+    def test_does_not_wait_for_rate_limiter_past_deadline(self):
+        rate_limiter = RateLimiter(rate=1)
+        self.service.get('/path', rate_limiter=rate_limiter)
+        start_time = time.time()
+        with deadline(0.1):
+            with self.assertRaises(DeadlineExceeded):
+                self.service.get('/path', rate_limiter=rate_limiter)
+        self.assertLess(time.time() - start_time, 0.5)
+        self.assertEqual(self.request.call_count, 1)
+
+    def test_does_not_wait_for_in_flight_requests_past_deadline(self):
+        service = HTTPServiceClient('http://service.com/', max_in_flight=1)
+        sending = threading.Event()
+        release = threading.Event()
+
+        def request(**kwargs):
+            sending.set()
+            release.wait(1)
+            return self.response
+        self.request.side_effect = request
+        thread = threading.Thread(target=lambda: service.get('/slow'))
+        thread.start()
+        sending.wait(1)
+
+        start_time = time.time()
+        with deadline(0.05):
+            with self.assertRaises(DeadlineExceeded):
+                service.get('/path')
+        self.assertLess(time.time() - start_time, 0.5)
+        release.set()
+        thread.join()
+
+    def test_hedges_slow_requests(self):
+        release = threading.Event()
+        slow = Mock(spec=Response(), status_code=200)
+        slow.close.side_effect = lambda: closed.set()
+        closed = threading.Event()
+
+        def request(**kwargs):
+            if self.request.call_count == 1:
+                release.wait()
+                return slow
+            return self.response
+        self.request.side_effect = request
+
+        response = self.service.get(
+            '/path', hedge_policy=HedgePolicy(delay=0.01))
+        self.assertIs(response, self.response)
+        self.assertEqual(self.request.call_count, 2)
+        release.set()
+        self.assertTrue(closed.wait(1))
+
+    def test_hedged_requests_wait_for_acceptable_responses(self):
+        failed = Mock(spec=Response(), status_code=500)
+
+        def request(**kwargs):
+            if self.request.call_count == 1:
+                time.sleep(0.05)
+                return self.response
+            return failed
+        self.request.side_effect = request
+
+        response = self.service.get(
+            '/path', hedge_policy=HedgePolicy(delay=0.01))
+        self.assertIs(response, self.response)
+        failed.close.assert_called_once_with()
+
+    def test_hedges_are_limited_by_budget(self):
+        def request(**kwargs):
+            time.sleep(0.02)
+            return self.response
+        self.request.side_effect = request
+
+        self.service.get(
+            '/path', hedge_policy=HedgePolicy(delay=0.001, budget_max=0))
+        self.service.post(
+            '/path', hedge_policy=HedgePolicy(delay=0.001))
+        self.assertEqual(self.request.call_count, 2)
+
+    @patch('demands.deadline.monotonic', return_value=0)
+    def test_deadline_bounds_request_timeouts(self, monotonic):
+        with deadline(5):
+            self.service.get('/path')
+            self.service.get('/path', timeout=2)
+            self.service.get('/path', timeout=(3, 10))
+        self.assertEqual(
+            [kwargs['timeout'] for _, kwargs in self.request.call_args_list],
+            [5, 2, (3, 5)])
+
+    @patch('demands.deadline.monotonic', return_value=0)
+    def test_requests_fail_fast_after_deadline(self, monotonic):
+        breaker = CircuitBreaker(failures=1)
+        with deadline(5):
+            monotonic.return_value = 5
+            with self.assertRaises(DeadlineExceeded):
+                self.service.get('/path', circuit_breaker=breaker)
+        self.assertFalse(self.request.called)
+        self.assertFalse(breaker.is_open('http://service.com/path'))
+
+    @patch('demands.time.sleep')
+    def test_does_not_retry_past_deadline(self, sleep):
+        self.response.configure_mock(
+            status_code=503, headers={'Retry-After': '10'})
+        with deadline(5):
+            with self.assertRaises(HTTPServiceError):
+                self.service.get('/path', retry_policy=RetryPolicy())
+        self.assertEqual(self.request.call_count, 1)
+
+    def test_coalesces_identical_requests(self):
+        service = HTTPServiceClient('http://service.com/', coalesce=True)
+        release = threading.Event()
+        responses = []
+
+        def request(**kwargs):
+            release.wait()
+            return self.response
+        self.request.side_effect = request
+
+        threads = [threading.Thread(
+            target=lambda: responses.append(service.get('/path')))
+            for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        while not self.request.called:
+            time.sleep(0.001)
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.request.call_count, 1)
+        # each caller gets its own response, copied from the one received
+        self.assertEqual(len(set(map(id, responses))), 5)
+        self.assertIn(self.response, responses)
+        self.assertEqual(
+            [response.status_code for response in responses], [200] * 5)
+
+    def test_does_not_coalesce_streamed_requests(self):
+        service = HTTPServiceClient('http://service.com/', coalesce=True)
+        release = threading.Event()
+        responses = []
+
+        def request(**kwargs):
+            release.wait(1)
+            return Mock(spec=Response(), status_code=200)
+        self.request.side_effect = request
+
+        threads = [threading.Thread(
+            target=lambda: responses.append(service.get('/path', stream=True)))
+            for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for _ in range(100):
+            if self.request.call_count == 2:
+                break
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.request.call_count, 2)
+        self.assertIsNot(responses[0], responses[1])
+
+    def test_coalesced_requests_demand_their_own_response_codes(self):
+        service = HTTPServiceClient('http://service.com/', coalesce=True)
+        self.response.status_code = 404
+        release = threading.Event()
+        results = {}
+
+        def request(**kwargs):
+            release.wait()
+            return self.response
+        self.request.side_effect = request
+
+        def get(name, **kwargs):
+            try:
+                results[name] = service.get('/path', **kwargs)
+            except HTTPServiceError as e:
+                results[name] = e
+
+        threads = [
+            threading.Thread(target=get, args=('default',)),
+            threading.Thread(target=get, args=('expected',), kwargs={
+                'expected_response_codes': [404]}),
+        ]
+        for thread in threads:
+            thread.start()
+        while not self.request.called:
+            time.sleep(0.001)
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.request.call_count, 1)
+        self.assertIsInstance(results['default'], HTTPServiceError)
+        self.assertEqual(results['expected'].status_code, 404)
+
+    def test_does_not_coalesce_unsafe_methods(self):
+        service = HTTPServiceClient('http://service.com/', coalesce=True)
+        self.assertIsNone(service._get_coalescing_key(
+            {'method': 'POST'}, {'coalesce': True}))
+        self.assertIsNotNone(service._get_coalescing_key(
+            {'method': 'GET'}, {'coalesce': True}))
+
+    def test_pool_options_configure_mounted_adapters(self):
+        service = HTTPServiceClient(
+            'http://service.com/', pool_connections=2, pool_maxsize=50,
+            pool_block=True)
+        for adapter in itervalues(service.adapters):
+            self.assertEqual(adapter._pool_connections, 2)
+            self.assertEqual(adapter._pool_maxsize, 50)
+            self.assertTrue(adapter._pool_block)
+
+    def test_keep_alive_can_be_disabled(self):
+        service = HTTPServiceClient(
+            'http://service.com/', keep_alive=False, headers={'Foo': 'Bar'})
+        service.get('/path')
+        self.request.assert_called_with(
+            method='GET', url='http://service.com/path', allow_redirects=True,
+            headers={'Foo': 'Bar', 'Connection': 'close'})
+
+    def test_map_returns_results_in_order(self):
+        self.request.side_effect = lambda url, **kwargs: Mock(
+            spec=Response(), status_code=200, url=url)
+        results = list(self.service.map(
+            'GET', ['/a', ('/b', {'params': {'c': 'd'}})], concurrency=2))
+        self.assertEqual(
+            [request for request, _ in results],
+            ['/a', ('/b', {'params': {'c': 'd'}})])
+        self.assertEqual(
+            [response.url for _, response in results],
+            ['http://service.com/a', 'http://service.com/b'])
+        self.request.assert_any_call(
+            method='GET', url='http://service.com/b', params={'c': 'd'})
+
+    def test_map_returns_errors_as_results(self):
+        self.response.configure_mock(
+            url='http://broken/', status_code=500, content='content')
+        self.response.json.side_effect = ValueError
+        results = list(self.service.map('GET', ['/a', '/b'], ordered=False))
+        self.assertEqual(
+            sorted(request for request, _ in results), ['/a', '/b'])
+        for _, result in results:
+            self.assertIsInstance(result, HTTPServiceError)
+
+    def test_map_bounds_concurrent_requests(self):
+        lock = threading.Lock()
+        running = [0]
+        most_running = [0]
+
+        def request(**kwargs):
+            with lock:
+                running[0] += 1
+                most_running[0] = max(most_running[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+            return self.response
+        self.request.side_effect = request
+
+        results = list(self.service.map(
+            'GET', ['/%d' % i for i in range(12)], concurrency=3))
+        self.assertEqual(len(results), 12)
+        self.assertLessEqual(most_running[0], 3)
+
+    def test_map_sends_requests_as_results_are_consumed(self):
+        for ordered in (True, False):
+            self.request.reset_mock()
+            results = self.service.map(
+                'GET', ('/%d' % i for i in range(1000)), concurrency=4,
+                ordered=ordered)
+            next(results)
+            time.sleep(0.05)
+            self.assertLessEqual(self.request.call_count, 5)
+            results.close()
+
+
+class ThreadSafetyTests(PatchedSessionTests):
+    threads = 20
+    requests_per_thread = 50
+
+    def setUp(self):
+        PatchedSessionTests.setUp(self)
+        self.service = HTTPServiceClient(
+            'http://service.com/', headers={'shared': 'header'},
+            params={'shared': 'param'})
+        self.request.side_effect = self.check_request
+        self.errors = []
+
+    def check_request(self, **kwargs):
+        thread = kwargs['headers']['thread']
+        adapter = self.service.get_adapter(kwargs['url'])
+        if kwargs['headers'] != {'shared': 'header', 'thread': thread}:
+            self.errors.append(kwargs['headers'])
+        if kwargs['params'] != {'shared': 'param', 'thread': thread}:
+            self.errors.append(kwargs['params'])
+        if adapter.max_retries != int(thread):
+            self.errors.append(adapter.max_retries)
+        return self.response
+
+    def make_requests(self, thread):
+        for _ in range(self.requests_per_thread):
+            self.service.get(
+                '/path', headers={'thread': thread},
+                params={'thread': thread}, max_retries=int(thread))
+
+    def test_concurrent_requests_do_not_share_state(self):
+        threads = [
+            threading.Thread(target=self.make_requests, args=(str(i),))
+            for i in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.errors, [])
+        self.assertEqual(
+            self.request.call_count, self.threads * self.requests_per_thread)
+        self.assertEqual(self.service._shared_request_params, {
+            'headers': {'shared': 'header'}, 'params': {'shared': 'param'}})
+        for adapter in itervalues(self.service.adapters):
+            self.assertNotIn(adapter.max_retries, range(self.threads))
 
 
 def get_parsed_log_messages(mock_log, log_level):
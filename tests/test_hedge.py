@@ -0,0 +1,32 @@
+from unittest import TestCase
+
+from demands.hedge import HedgePolicy
+
+
+class HedgePolicyTest(TestCase):
+    def test_applies_to_idempotent_reads(self):
+        policy = HedgePolicy()
+        self.assertTrue(policy.applies('get'))
+        self.assertFalse(policy.applies('POST'))
+
+    def test_waits_for_delay(self):
+        policy = HedgePolicy(delay=0.2, percentile=95, min_samples=10)
+        for _ in range(9):
+            policy.record(1)
+        self.assertEqual(policy.get_delay(), 0.2)
+
+    def test_waits_for_percentile_of_latencies(self):
+        policy = HedgePolicy(delay=0.2, percentile=50, min_samples=10)
+        for latency in range(1, 11):
+            policy.record(latency / 100.0)
+        self.assertGreaterEqual(policy.get_delay(), 0.05)
+        self.assertLessEqual(policy.get_delay(), 0.05 * 1.05)
+
+    def test_hedges_are_limited_by_budget(self):
+        policy = HedgePolicy(budget_ratio=0.5, budget_max=2)
+        self.assertEqual(
+            [policy.spend_budget() for _ in range(3)], [True, True, False])
+        policy.add_request()
+        self.assertFalse(policy.spend_budget())
+        policy.add_request()
+        self.assertTrue(policy.spend_budget())
@@ -0,0 +1,87 @@
+from unittest import TestCase, skipIf
+
+from requests import ConnectionError, ReadTimeout
+
+from demands import HTTPServiceClient, HTTPServiceError
+from demands.http2 import HTTP2Adapter
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+@skipIf(httpx is None, 'requires httpx')
+class HTTP2AdapterTest(TestCase):
+    def setUp(self):
+        self.requests = []
+        self.service = HTTPServiceClient('http://service.com/')
+        self.service.mount('http://', HTTP2Adapter(
+            transport=httpx.MockTransport(self.handle)))
+
+    def handle(self, request):
+        self.requests.append(request)
+        if request.url.path == '/timeout':
+            raise httpx.ReadTimeout('timed out', request=request)
+        if request.url.path == '/down':
+            raise httpx.ConnectError('refused', request=request)
+        status_code = 404 if request.url.path == '/missing' else 200
+        return httpx.Response(
+            status_code, json={'path': request.url.path},
+            headers={'Set-Cookie': 'session=abc'})
+
+    def test_returns_requests_responses(self):
+        response = self.service.get('/path', params={'page': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_ok)
+        self.assertEqual(response.url, 'http://service.com/path?page=2')
+        self.assertEqual(response.json(), {'path': '/path'})
+        self.assertEqual(response.headers['content-type'], 'application/json')
+        self.assertEqual(response.http_version, 'HTTP/1.1')
+
+    def test_sends_request_body_and_headers(self):
+        self.service.post(
+            '/path', json={'name': 'value'}, headers={'X-Name': 'value'})
+        request = self.requests[0]
+        self.assertEqual(request.method, 'POST')
+        self.assertEqual(request.content, b'{"name": "value"}')
+        self.assertEqual(request.headers['X-Name'], 'value')
+
+    def test_streams_responses(self):
+        response = self.service.get('/path', stream=True)
+        self.assertEqual(
+            b''.join(response.iter_content(4)), b'{"path":"/path"}')
+
+    def test_keeps_cookies(self):
+        self.service.get('/path')
+        self.assertEqual(self.service.cookies['session'], 'abc')
+        self.service.get('/path')
+        self.assertEqual(self.requests[1].headers['Cookie'], 'session=abc')
+
+    def test_demands_acceptable_responses(self):
+        with self.assertRaises(HTTPServiceError):
+            self.service.get('/missing')
+
+    def test_raises_requests_exceptions(self):
+        with self.assertRaises(ReadTimeout):
+            self.service.get('/timeout', timeout=(1, 2))
+        with self.assertRaises(ConnectionError):
+            self.service.get('/down')
+
+    def test_rejects_params_the_adapter_ignores(self):
+        for kwargs in (
+                {'verify': False},
+                {'verify': '/etc/ssl/ca.pem'},
+                {'cert': ('client.pem', 'client.key')},
+                {'proxies': {'http': 'http://proxy:3128'}}):
+            with self.assertRaises(ValueError):
+                self.service.get('/path', **kwargs)
+        self.assertEqual(self.requests, [])
+
+    def test_client_can_be_created_with_http2(self):
+        service = HTTPServiceClient('https://service.com/', http2=True)
+        self.assertIsInstance(
+            service.get_adapter('https://service.com/'), HTTP2Adapter)
+        with self.assertRaises(ValueError):
+            HTTPServiceClient(
+                'https://service.com/', http2=True, pool_maxsize=10)
@@ -0,0 +1,69 @@
+from unittest import TestCase
+
+from demands.metrics import (
+    LatencyHistogram, MetricsAggregator, RequestEvent, get_path_template)
+
+
+class PathTemplateTest(TestCase):
+    def test_replaces_numeric_segments(self):
+        self.assertEqual(
+            get_path_template('/users/1234/'), '/users/{id}/')
+        self.assertEqual(get_path_template('/v2/users'), '/v2/users')
+        self.assertEqual(get_path_template(''), '/')
+
+
+class LatencyHistogramTest(TestCase):
+    def setUp(self):
+        self.histogram = LatencyHistogram()
+
+    def test_percentiles_are_within_bucket_growth(self):
+        for latency in range(1, 1001):
+            self.histogram.add(latency / 1000.0)
+        for percent in (50, 95, 99):
+            exact = percent / 100.0
+            self.assertGreaterEqual(self.histogram.percentile(percent), exact)
+            self.assertLessEqual(
+                self.histogram.percentile(percent), exact * 1.05)
+        self.assertEqual(self.histogram.percentile(100), 1)
+
+    def test_empty_histogram(self):
+        self.assertIsNone(self.histogram.percentile(50))
+        self.assertIsNone(self.histogram.mean)
+
+    def test_latencies_below_min_value(self):
+        self.histogram.add(0)
+        self.assertEqual(self.histogram.percentile(50), 0)
+
+
+class MetricsAggregatorTest(TestCase):
+    def setUp(self):
+        self.metrics = MetricsAggregator()
+
+    def test_aggregates_by_method_and_path_template(self):
+        for duration in (0.1, 0.2, 0.3):
+            self.metrics(RequestEvent(
+                'GET', '/users/{id}/', 'http://service.com/users/1/',
+                status_code=200, duration=duration, bytes_received=10))
+        self.metrics(RequestEvent(
+            'GET', '/users/{id}/', 'http://service.com/users/2/',
+            status_code=503, duration=0.4, retries=2))
+        self.metrics(RequestEvent(
+            'POST', '/users/', 'http://service.com/users/',
+            error=IOError(), bytes_sent=20))
+
+        stats = self.metrics.stats()
+        self.assertEqual(
+            sorted(stats), [('GET', '/users/{id}/'), ('POST', '/users/')])
+        users = stats[('GET', '/users/{id}/')]
+        self.assertEqual(users['count'], 4)
+        self.assertEqual(users['errors'], 1)
+        self.assertEqual(users['retries'], 2)
+        self.assertEqual(users['bytes_received'], 30)
+        self.assertAlmostEqual(users['mean'], 0.25)
+        self.assertEqual(users['max'], 0.4)
+        self.assertEqual(users['p99'], 0.4)
+        self.assertEqual(stats[('POST', '/users/')]['errors'], 1)
+        self.assertEqual(stats[('POST', '/users/')]['bytes_sent'], 20)
+
+        self.metrics.reset()
+        self.assertEqual(self.metrics.stats(), {})
@@ -1,5 +1,12 @@
+import json
+from itertools import chain, count
 from unittest import TestCase
 
+from mock import Mock, patch
+from requests import Response
+
+from demands import HTTPServiceError
+from demands.deadline import DeadlineExceeded, deadline
 from demands.pagination import PaginatedResults, PaginationType
 
 
@@ -114,3 +121,430 @@ class PagePaginationTestWithPageSizeGreaterThanTargetPage(TestCase):
 
     def test_iteration_stops_on_empty_next(self):
         self.assertEqual(len(list(self.psc)), 50)
+
+
+class PrefetchedPagePaginationTest(PagePaginationTest):
+    def setUp(self):
+        self.psc = PaginatedResults(
+            self.get, args=self.args, kwargs=self.kwargs, page_size=10,
+            results_key=None, prefetch=3)
+
+
+class PrefetchedItemPaginationTest(ItemPaginationTest):
+    def setUp(self):
+        self.psc = PaginatedResults(
+            self.get, args=self.args, kwargs=self.kwargs, page_size=10,
+            page_param='offset', page_size_param='limit',
+            pagination_type=PaginationType.ITEM, results_key=None,
+            prefetch=3)
+
+
+class PrefetchedPaginationPastLastPageTest(
+        ItemPaginationTestWithNestedResultsAndNextLink):
+    def setUp(self):
+        self.psc = PaginatedResults(
+            self.get, page_size=10,
+            page_param='offset', page_size_param='limit',
+            pagination_type=PaginationType.ITEM, next_key='next_page',
+            prefetch=3)
+
+    def test_errors_fetching_pages_are_raised(self):
+        def get(*args, **kwargs):
+            raise ValueError('No Data')
+
+        self.psc.paginated_fn = get
+        with self.assertRaises(ValueError):
+            list(self.psc)
+
+
+class CountedPaginationTestsMixin(object):
+    def get(self, *args, **kwargs):
+        offset = kwargs['offset']
+        self.requested.append(offset)
+        return {
+            'results': list(range(offset, min(offset + kwargs['limit'], 45))),
+            'count': 45,
+        }
+
+    def test_fetches_only_counted_pages(self):
+        self.assertEqual(sorted(self.psc), list(range(45)))
+        self.assertEqual(sorted(self.requested), [0, 10, 20, 30, 40])
+
+
+class CountedPaginationTest(TestCase, CountedPaginationTestsMixin):
+    def setUp(self):
+        self.requested = []
+        self.psc = PaginatedResults(
+            self.get, page_size=10, page_param='offset',
+            page_size_param='limit', pagination_type=PaginationType.ITEM,
+            prefetch=3)
+
+    def test_yields_items_in_order(self):
+        self.assertEqual(list(self.psc), list(range(45)))
+
+
+class UnorderedCountedPaginationTest(TestCase, CountedPaginationTestsMixin):
+    def setUp(self):
+        self.requested = []
+        self.psc = PaginatedResults(
+            self.get, page_size=10, page_param='offset',
+            page_size_param='limit', pagination_type=PaginationType.ITEM,
+            prefetch=3, ordered=False)
+
+
+class LargeCountedPaginationTest(TestCase):
+    def get(self, page, page_size):
+        self.requested.append(page)
+        start = (page - 1) * page_size
+        return {
+            'results': list(range(start, min(start + page_size, 10000))),
+            'count': 10000,
+        }
+
+    def assert_fetches_ahead_of_consumer(self, ordered):
+        self.requested = []
+        results = iter(PaginatedResults(
+            self.get, page_size=10, prefetch=4, ordered=ordered))
+        for _ in range(15):
+            next(results)
+        # the first page, and prefetch pages after each consumed page
+        self.assertLessEqual(len(self.requested), 1 + 4 + 1)
+
+    def test_fetches_pages_ahead_of_consumer(self):
+        self.assert_fetches_ahead_of_consumer(ordered=True)
+
+    def test_fetches_unordered_pages_ahead_of_consumer(self):
+        self.assert_fetches_ahead_of_consumer(ordered=False)
+
+
+class CountedPagePaginationTest(TestCase):
+    def setUp(self):
+        self.requested = []
+        self.psc = PaginatedResults(self.get, page_size=10, prefetch=3)
+
+    def get(self, page, page_size):
+        self.requested.append(page)
+        start = (page - 1) * page_size
+        return {
+            'results': list(range(start, min(start + page_size, 41))),
+            'count': 41,
+        }
+
+    def test_fetches_only_counted_pages(self):
+        self.assertEqual(list(self.psc), list(range(41)))
+        self.assertEqual(sorted(self.requested), [1, 2, 3, 4, 5])
+
+
+class StreamedPaginationTest(TestCase, PaginationTestsMixin):
+    def get(self, *args, **kwargs):
+        page = kwargs.pop('page')
+        page_size = kwargs.pop('page_size')
+        start = (page - 1) * page_size
+        results = super(StreamedPaginationTest, self).get(
+            start, start + page_size, *args, **kwargs)
+        data = {'results': results, 'next': 'next_url'}
+        if start + page_size >= len(self.responses):
+            data['next'] = None
+        encoded = json.dumps(data).encode('utf-8')
+        return Mock(headers={}, links={}, iter_content=lambda size: (
+            encoded[i:i + size] for i in range(0, len(encoded), size)))
+
+    def setUp(self):
+        self.psc = PaginatedResults(
+            self.get, args=self.args, kwargs=self.kwargs, page_size=10,
+            stream=True, stream_chunk_size=4)
+
+
+class PrefetchedStreamedPaginationTest(StreamedPaginationTest):
+    def setUp(self):
+        self.psc = PaginatedResults(
+            self.get, args=self.args, kwargs=self.kwargs, page_size=10,
+            stream=True, stream_chunk_size=4, prefetch=2)
+
+
+class CursorPaginationTest(TestCase):
+    def setUp(self):
+        self.requested = []
+        self.psc = PaginatedResults(
+            self.get, page_size=10, page_param='cursor',
+            pagination_type=PaginationType.CURSOR)
+
+    def get(self, page_size, cursor=None):
+        self.requested.append(cursor)
+        start = int(cursor or 0)
+        end = min(start + page_size, 25)
+        return {
+            'results': list(range(start, end)),
+            'next': str(end) if end < 25 else None,
+        }
+
+    def test_follows_next_cursors(self):
+        self.assertEqual(list(self.psc), list(range(25)))
+        self.assertEqual(self.requested, [None, '10', '20'])
+
+    def test_starts_from_start_cursor(self):
+        self.psc.options['start'] = '20'
+        self.assertEqual(list(self.psc), list(range(20, 25)))
+
+    def test_ignores_prefetch(self):
+        self.psc.options['prefetch'] = 3
+        self.assertEqual(list(self.psc), list(range(25)))
+        self.assertEqual(self.requested, [None, '10', '20'])
+
+
+class LinkHeaderPaginationTest(TestCase):
+    def setUp(self):
+        self.requested = []
+        self.psc = PaginatedResults(
+            self.get, page_size=10, page_param='url',
+            pagination_type=PaginationType.CURSOR, results_key=None)
+
+    def get(self, page_size, url='http://service.com/items?page=1'):
+        self.requested.append(url)
+        page = int(url.rsplit('=', 1)[1])
+        response = Response()
+        response.status_code = 200
+        response._content = json.dumps(
+            list(range((page - 1) * 10, page * 10))).encode('utf-8')
+        if page < 3:
+            response.headers['Link'] = (
+                '<http://service.com/items?page=%d>; rel="next"' % (page + 1))
+        return response
+
+    def test_follows_link_headers(self):
+        self.assertEqual(list(self.psc), list(range(30)))
+        self.assertEqual(self.requested, [
+            'http://service.com/items?page=1',
+            'http://service.com/items?page=2',
+            'http://service.com/items?page=3',
+        ])
+
+
+@patch('demands.pagination.time.time', Mock(return_value=0))
+class AdaptivePaginationTest(TestCase):
+    def setUp(self):
+        self.requested = []
+        self.errors = {}
+        self.psc = PaginatedResults(
+            self.get, page_size=10, page_param='offset',
+            page_size_param='limit', pagination_type=PaginationType.ITEM,
+            adaptive=True, min_page_size=5, max_page_size=40)
+
+    def get(self, offset, limit):
+        self.requested.append((offset, limit))
+        if limit in self.errors:
+            raise HTTPServiceError(Mock(
+                status_code=self.errors[limit], url='http://service.com/',
+                json=Mock(return_value={})))
+        return {'results': list(range(offset, min(offset + limit, 200)))}
+
+    def test_grows_page_size_up_to_max_page_size(self):
+        self.assertEqual(list(self.psc), list(range(200)))
+        self.assertEqual(self.requested, [
+            (0, 10), (10, 20), (30, 40), (70, 40), (110, 40), (150, 40),
+            (190, 40)])
+
+    def test_shrinks_page_size_on_server_errors(self):
+        self.errors = {20: 503}
+        self.assertEqual(list(self.psc), list(range(200)))
+        self.assertEqual(self.requested[:4], [
+            (0, 10), (10, 20), (10, 10), (20, 20)])
+
+    def test_raises_client_errors(self):
+        self.errors = {20: 404}
+        with self.assertRaises(HTTPServiceError):
+            list(self.psc)
+
+    def test_raises_errors_at_min_page_size(self):
+        self.errors = {10: 503, 5: 503}
+        with self.assertRaises(HTTPServiceError):
+            list(self.psc)
+        self.assertEqual(self.requested, [(0, 10), (0, 5)])
+
+    def test_requires_item_or_cursor_pagination(self):
+        self.psc.options['pagination_type'] = PaginationType.PAGE
+        with self.assertRaises(ValueError):
+            list(self.psc)
+
+
+class AdaptivePageSizeLimitsTest(TestCase):
+    def setUp(self):
+        self.psc = PaginatedResults(
+            self.get, page_size=40, page_param='offset',
+            page_size_param='limit', pagination_type=PaginationType.ITEM,
+            adaptive=True, max_page_latency=1, max_page_bytes=100)
+        self.requested = []
+
+    def get(self, offset, limit):
+        self.requested.append(limit)
+        response = Response()
+        response.status_code = 200
+        response._content = json.dumps({
+            'results': list(range(offset, min(offset + limit, 100)))
+        }).encode('utf-8')
+        return response
+
+    def test_shrinks_pages_over_max_page_bytes(self):
+        self.assertEqual(list(self.psc), list(range(100)))
+        self.assertEqual(self.requested[:2], [40, 20])
+
+    @patch('demands.pagination.time.time')
+    def test_shrinks_pages_over_max_page_latency(self, time):
+        time.side_effect = chain([0, 0, 2], count(2, 0.1))
+        self.psc.options['max_page_bytes'] = None
+        self.assertEqual(list(self.psc), list(range(100)))
+        self.assertEqual(self.requested[:3], [40, 20, 40])
+
+
+class ResumablePaginationTest(TestCase):
+    def get(self, offset, limit):
+        return {'results': list(range(offset, min(offset + limit, 45)))}
+
+    def get_cursor(self, limit, cursor=0):
+        end = min(cursor + limit, 45)
+        return {
+            'results': list(range(cursor, end)),
+            'next': end if end < 45 else None,
+        }
+
+    def make_results(self, **options):
+        return PaginatedResults(
+            self.get, page_size=10, page_param='offset',
+            page_size_param='limit', pagination_type=PaginationType.ITEM,
+            **options)
+
+    def test_position_is_the_next_item(self):
+        results = self.make_results()
+        self.assertIsNone(results.position)
+        iterator = iter(results)
+        for _ in range(13):
+            next(iterator)
+        self.assertEqual(results.position, {'page': 10, 'offset': 3})
+        for _ in range(7):
+            next(iterator)
+        self.assertEqual(results.position, {'page': 10, 'offset': 10})
+        next(iterator)
+        self.assertEqual(results.position, {'page': 20, 'offset': 1})
+
+    def test_resumes_from_position(self):
+        results = self.make_results()
+        iterator = iter(results)
+        consumed = [next(iterator) for _ in range(23)]
+
+        resumed = self.make_results(resume=results.position)
+        self.assertEqual(consumed + list(resumed), list(range(45)))
+
+    def test_resumes_prefetched_pages(self):
+        results = self.make_results(
+            prefetch=2, resume={'page': 30, 'offset': 5})
+        self.assertEqual(list(results), list(range(35, 45)))
+
+    def test_resumes_cursor_pages(self):
+        results = PaginatedResults(
+            self.get_cursor, page_size=10, page_param='cursor',
+            page_size_param='limit', pagination_type=PaginationType.CURSOR,
+            resume={'page': 20, 'offset': 2})
+        self.assertEqual(list(results), list(range(22, 45)))
+
+    def test_resumes_from_first_cursor_page(self):
+        def get_cursor(limit, cursor=None):
+            return self.get_cursor(limit, cursor or 0)
+
+        def make_results(**options):
+            return PaginatedResults(
+                get_cursor, page_size=10, page_param='cursor',
+                page_size_param='limit',
+                pagination_type=PaginationType.CURSOR, **options)
+
+        results = make_results()
+        iterator = iter(results)
+        consumed = [next(iterator) for _ in range(5)]
+        self.assertEqual(results.position, {'page': None, 'offset': 5})
+
+        resumed = make_results(resume=results.position)
+        self.assertEqual(consumed + list(resumed), list(range(45)))
+
+    def test_calls_checkpoint_every_checkpoint_pages(self):
+        positions = []
+        results = self.make_results(
+            checkpoint=positions.append, checkpoint_pages=2)
+        list(results)
+        self.assertEqual(positions, [
+            {'page': 20, 'offset': 0},
+            {'page': 40, 'offset': 0},
+            {'page': 40, 'offset': 5},
+        ])
+
+    def test_requires_ordered_pages(self):
+        with self.assertRaises(ValueError):
+            self.make_results(ordered=False, checkpoint=lambda position: None)
+        with self.assertRaises(ValueError):
+            self.make_results(
+                ordered=False, resume={'page': 10, 'offset': 0})
+
+
+class PageIterationTest(TestCase):
+    def setUp(self):
+        self.psc = PaginatedResults(
+            self.get, page_size=10, page_param='offset',
+            page_size_param='limit', pagination_type=PaginationType.ITEM)
+
+    def get(self, offset, limit):
+        response = Response()
+        response.status_code = 200
+        response._content = json.dumps({
+            'results': list(range(offset, min(offset + limit, 25)))
+        }).encode('utf-8')
+        return response
+
+    def test_iterates_pages(self):
+        pages = list(self.psc.iter_pages())
+        self.assertEqual([page.page_id for page in pages], [0, 10, 20])
+        self.assertEqual(pages[2].items, list(range(20, 25)))
+        self.assertEqual(
+            pages[2].byte_size, len(b'{"results": [20, 21, 22, 23, 24]}'))
+        for page in pages:
+            self.assertGreaterEqual(page.latency, 0)
+
+    def test_iterates_pages_from_position(self):
+        self.psc.options['resume'] = {'page': 10, 'offset': 5}
+        pages = list(self.psc.iter_pages())
+        self.assertEqual([page.page_id for page in pages], [10, 20])
+        self.assertEqual(self.psc.position, {'page': 20, 'offset': 5})
+
+    def test_iterates_batches(self):
+        self.assertEqual(list(self.psc.iter_batches(7)), [
+            list(range(0, 7)), list(range(7, 14)), list(range(14, 21)),
+            list(range(21, 25))])
+
+
+class DeadlinePaginationTest(TestCase):
+    def get(self, page, page_size):
+        self.pages.append(page)
+        if page == 3:
+            self.clock.return_value = 5
+        return {'results': list(range(100))[(page - 1) * 10:page * 10]}
+
+    def setUp(self):
+        self.pages = []
+        self.clock = patch('demands.deadline.monotonic').start()
+        self.clock.return_value = 0
+        self.addCleanup(patch.stopall)
+
+    def test_stops_fetching_pages_after_deadline(self):
+        results = PaginatedResults(self.get, page_size=10)
+        items = []
+        with deadline(5):
+            with self.assertRaises(DeadlineExceeded):
+                for item in results:
+                    items.append(item)
+        self.assertEqual(self.pages, [1, 2, 3])
+        self.assertEqual(items, list(range(30)))
+        self.assertEqual(results.position, {'page': 4, 'offset': 0})
+
+    def test_prefetched_pages_get_the_deadline(self):
+        results = PaginatedResults(self.get, page_size=10, prefetch=2)
+        with deadline(5):
+            with self.assertRaises(DeadlineExceeded):
+                list(results)
+        self.assertLessEqual(max(self.pages), 5)
@@ -0,0 +1,75 @@
+from email.utils import formatdate
+from unittest import TestCase
+
+from mock import Mock, patch
+
+from demands.retry import RetryPolicy
+
+
+def make_response(status_code=503, headers=None):
+    return Mock(status_code=status_code, headers=headers or {})
+
+
+class RetryPolicyTest(TestCase):
+    def setUp(self):
+        self.policy = RetryPolicy(
+            retries=3, backoff_factor=1, max_backoff=3, jitter=False)
+
+    def test_retries_selected_status_codes(self):
+        self.assertEqual(
+            self.policy.get_delay('GET', make_response(503), 1), 1)
+        self.assertIsNone(self.policy.get_delay('GET', make_response(500), 1))
+
+    def test_retries_idempotent_methods(self):
+        self.assertIsNone(self.policy.get_delay('POST', make_response(), 1))
+        self.assertEqual(self.policy.get_delay('put', make_response(), 1), 1)
+
+    def test_backs_off_exponentially_up_to_max_backoff(self):
+        delays = [self.policy.get_delay('GET', make_response(), retry)
+                  for retry in (1, 2, 3)]
+        self.assertEqual(delays, [1, 2, 3])
+
+    def test_stops_after_retries(self):
+        self.assertIsNone(self.policy.get_delay('GET', make_response(), 4))
+
+    @patch('demands.retry.random.uniform')
+    def test_jitter_randomizes_backoff(self, uniform):
+        uniform.return_value = 0.5
+        self.policy.jitter = True
+        self.assertEqual(
+            self.policy.get_delay('GET', make_response(), 2), 0.5)
+        uniform.assert_called_once_with(0, 2)
+
+    def test_respects_retry_after_seconds(self):
+        response = make_response(429, {'Retry-After': '2'})
+        self.assertEqual(self.policy.get_delay('GET', response, 1), 2)
+
+    @patch('demands.retry.time.time')
+    def test_respects_retry_after_date(self, time):
+        time.return_value = 1000000000
+        response = make_response(
+            503, {'Retry-After': formatdate(1000000002, usegmt=True)})
+        self.assertEqual(self.policy.get_delay('GET', response, 1), 2)
+
+    def test_retry_after_is_limited_by_max_backoff(self):
+        response = make_response(429, {'Retry-After': '120'})
+        self.assertEqual(self.policy.get_delay('GET', response, 1), 3)
+
+    def test_retries_are_limited_by_budget(self):
+        policy = RetryPolicy(budget_ratio=0.5, budget_max=2)
+        self.assertIsNotNone(policy.get_delay('GET', make_response(), 1))
+        self.assertIsNotNone(policy.get_delay('GET', make_response(), 1))
+        self.assertIsNone(policy.get_delay('GET', make_response(), 1))
+
+        policy.add_request()
+        self.assertIsNone(policy.get_delay('GET', make_response(), 1))
+        policy.add_request()
+        self.assertIsNotNone(policy.get_delay('GET', make_response(), 1))
+
+    def test_retries_past_max_delay_do_not_spend_budget(self):
+        policy = RetryPolicy(budget_max=1)
+        response = make_response(503, {'Retry-After': '5'})
+        self.assertIsNone(policy.get_delay('GET', response, 1, max_delay=2))
+        self.assertEqual(
+            policy.get_delay('GET', response, 1, max_delay=10), 5)
+        self.assertIsNone(policy.get_delay('GET', response, 1))
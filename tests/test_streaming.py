@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import json
+from unittest import TestCase
+
+from demands.streaming import JSONItemStream
+
+
+def chunked(data, size=1):
+    encoded = json.dumps(data).encode('utf-8')
+    return [encoded[i:i + size] for i in range(0, len(encoded), size)]
+
+
+class JSONItemStreamTest(TestCase):
+    page = {
+        'count': 3,
+        'results': [
+            {'id': 1, 'name': u'caf\xe9', 'tags': ['a', 'b']},
+            12345,
+            [1.5, None, True, 'text with ] and , inside'],
+        ],
+        'next': None,
+    }
+
+    def test_decodes_items_split_across_chunks(self):
+        for size in (1, 2, 7, 1000):
+            stream = JSONItemStream(chunked(self.page, size), key='results')
+            self.assertEqual(list(stream), self.page['results'])
+            self.assertEqual(stream.count, 3)
+            self.assertEqual(stream.data, {'count': 3, 'next': None})
+            self.assertTrue(stream.finished)
+
+    def test_decodes_top_level_arrays(self):
+        stream = JSONItemStream(chunked(self.page['results'], 3))
+        self.assertEqual(list(stream), self.page['results'])
+
+    def test_decodes_empty_arrays(self):
+        stream = JSONItemStream([b'{"results": [ ], "next": null}'],
+                                key='results')
+        self.assertEqual(list(stream), [])
+        self.assertEqual(stream.data, {'next': None})
+
+    def test_decodes_objects_without_the_key(self):
+        stream = JSONItemStream([b'{}'], key='results')
+        self.assertEqual(list(stream), [])
+        self.assertTrue(stream.finished)
+
+    def test_is_lazy(self):
+        def chunks():
+            yield b'{"results": [1, '
+            raise AssertionError('read too far')
+        self.assertEqual(next(JSONItemStream(chunks(), key='results')), 1)
+
+    def test_raises_on_truncated_data(self):
+        stream = JSONItemStream([b'{"results": [1, 2'], key='results')
+        with self.assertRaises(ValueError):
+            list(stream)
+
+    def test_raises_on_invalid_data(self):
+        stream = JSONItemStream([b'{"results": {}}'], key='results')
+        with self.assertRaises(ValueError):
+            list(stream)
@@ -0,0 +1,48 @@
+from unittest import TestCase
+
+from mock import patch
+
+from demands.throttle import RateLimiter
+
+
+class RateLimiterTest(TestCase):
+    def setUp(self):
+        self.monotonic_patcher = patch('demands.throttle.monotonic')
+        self.monotonic = self.monotonic_patcher.start()
+        self.monotonic.return_value = 0
+
+    def tearDown(self):
+        self.monotonic_patcher.stop()
+
+    def test_spaces_requests_at_rate(self):
+        limiter = RateLimiter(rate=10)
+        self.assertEqual(
+            [round(limiter.reserve(), 3) for _ in range(4)],
+            [0, 0.1, 0.2, 0.3])
+
+    def test_allows_bursts_after_idle_periods(self):
+        limiter = RateLimiter(rate=10, burst=3)
+        self.assertEqual([limiter.reserve() for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(limiter.reserve(), 0.1)
+        self.monotonic.return_value = 10
+        self.assertEqual([limiter.reserve() for _ in range(3)], [0, 0, 0])
+
+    def test_refills_tokens_over_time(self):
+        limiter = RateLimiter(rate=10)
+        limiter.reserve()
+        self.monotonic.return_value = 0.05
+        self.assertAlmostEqual(limiter.reserve(), 0.05)
+
+    @patch('demands.throttle.time.sleep')
+    def test_acquire_waits_for_token(self, sleep):
+        limiter = RateLimiter(rate=2)
+        limiter.acquire()
+        self.assertFalse(sleep.called)
+        limiter.acquire()
+        sleep.assert_called_once_with(0.5)
+
+    def test_does_not_reserve_past_max_delay(self):
+        limiter = RateLimiter(rate=10)
+        limiter.reserve()
+        self.assertIsNone(limiter.reserve(max_delay=0.05))
+        self.assertAlmostEqual(limiter.reserve(max_delay=0.1), 0.1)